@@ -0,0 +1,70 @@
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from tab_util.centrality import sparse_centralises
+from tab_util.network import networkx_centralises, build_edge_list, build_graph
+
+METRICS: list[str] = ["Degree", "In-Degree", "Out-Degree", "Closeness", "Betweenness", "Clustering", "Pagerank"]
+
+
+def synthetic_graph(nodes: int, density: float, seed: int = 42) -> nx.DiGraph:
+    # Sanctions are concentrated: few publishers, heavy tailed numbers of entities per country pair
+    rng: np.random.Generator = np.random.default_rng(seed)
+    edges: int = int(nodes * (nodes - 1) * density)
+    source: np.ndarray = np.minimum(rng.zipf(1.5, edges) - 1, nodes - 1)
+    target: np.ndarray = rng.integers(0, nodes, edges)
+    df: pd.DataFrame = pd.DataFrame({"source": source, "target": target, "weight": rng.pareto(1.2, edges) * 10 + 1})
+    df = df[df["source"] != df["target"]].groupby(["source", "target"], as_index=False)["weight"].sum()
+    df[["source", "target"]] = df[["source", "target"]].map(lambda c: f"C{c:05d}")
+
+    return build_graph(df)
+
+
+def timed(function: callable, graph: nx.DiGraph, repeat: int) -> (pd.DataFrame, float):
+    timings: list[float] = []
+
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        df: pd.DataFrame = function(graph)
+        timings.append(time.perf_counter() - started)
+
+    return df.set_index("Country").sort_index(), min(timings)
+
+
+def compare(name: str, graph: nx.DiGraph, repeat: int = 3, tolerance: float = 1e-4) -> None:
+    reference, networkx_time = timed(networkx_centralises, graph, repeat)
+    result, sparse_time = timed(sparse_centralises, graph, repeat)
+
+    # Both engines compute the weighted betweenness with networkx, the other six metrics are compared separately
+    _, networkx_other = timed(lambda g: networkx_centralises(g, betweenness=False), graph, repeat)
+    _, sparse_other = timed(lambda g: sparse_centralises(g, betweenness=False), graph, repeat)
+
+    deviation: pd.Series = (reference[METRICS] - result[METRICS]).abs().max()
+    parity: str = "OK" if (deviation < tolerance).all() else "FAILED " + deviation[deviation >= tolerance].to_string()
+
+    print(f"{name:<16} nodes={graph.number_of_nodes():>6} edges={graph.number_of_edges():>8} parity={parity}\n"
+          f"{'':<16} all metrics:         networkx={networkx_time:8.3f}s sparse={sparse_time:8.3f}s "
+          f"speed-up={networkx_time / sparse_time:6.1f}x\n"
+          f"{'':<16} without betweenness: networkx={networkx_other:8.3f}s sparse={sparse_other:8.3f}s "
+          f"speed-up={networkx_other / sparse_other:6.1f}x")
+
+
+def benchmark_centrality(nodes: int = 250, density: float = 0.05, scale: int = 10, repeat: int = 3,
+                         database: bool = False) -> None:
+    nodes, density, scale, repeat = int(nodes), float(density), int(scale), int(repeat)
+
+    if str(database).lower() in ("1", "true", "yes"):
+        from dashboard import engine
+        compare("database", build_graph(build_edge_list(None, None, None, None, None, engine)), repeat)
+
+    compare("synthetic", synthetic_graph(nodes, density), repeat)
+    compare(f"synthetic x{scale}", synthetic_graph(nodes * scale, density / scale), repeat)
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    benchmark_centrality(**options)
@@ -0,0 +1,42 @@
+import sys
+import time
+
+import networkx as nx
+
+from benchmark_centrality import synthetic_graph
+from tab_util.network import plot_network, LAYOUT_SEED
+
+
+def measure(graph: nx.DiGraph, pos: dict, mode: str, repeat: int) -> (float, float, int, int):
+    build, serialise = [], []
+
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        fig = plot_network(graph, pos, mode)
+        build.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        payload: str = fig.to_json()
+        serialise.append(time.perf_counter() - started)
+
+    return min(build), min(serialise), len(payload.encode()), len(fig.data)
+
+
+def benchmark_network_plot(nodes: int = 250, density: float = 0.05, scale: int = 10, repeat: int = 3) -> None:
+    nodes, density, scale, repeat = int(nodes), float(density), int(scale), int(repeat)
+
+    # The browser render time grows with the number of traces, the payload with the size of the figure JSON
+    for name, graph in [("synthetic", synthetic_graph(nodes, density)),
+                        (f"synthetic x{scale}", synthetic_graph(nodes * scale, density / scale))]:
+        pos: dict = nx.spring_layout(graph, weight='weight', seed=LAYOUT_SEED)
+        print(f"{name:<16} nodes={graph.number_of_nodes():>6} edges={graph.number_of_edges():>8}")
+
+        for mode in ["traces", "webgl"]:
+            build, serialise, size, traces = measure(graph, pos, mode, repeat)
+            print(f"{'':<16} {mode:<7} traces={traces:>8} payload={size / 2 ** 20:8.2f} MiB "
+                  f"build={build:8.3f}s to_json={serialise:8.3f}s")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    benchmark_network_plot(**options)
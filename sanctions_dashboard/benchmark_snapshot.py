@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+from tab_util.cache import query_cache, read_sql
+from tab_util.entity_search import search_entity
+from tab_util.network import build_edge_list
+from tab_util.sanctions_by_country import generate_country_aggregates, generate_country_data, timeline_query
+from tab_util.search_index import EntitySearchIndex
+from tab_util.snapshot import SnapshotEngine, SNAPSHOT_DIR, run_query
+from tab_util.util import filter_options, load_page
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+from DB import create_engine
+
+
+def tab_queries(country: str, source: str, query: str, index: EntitySearchIndex) -> dict[str, callable]:
+    return {
+        "country aggregates": lambda e: generate_country_aggregates("Sanctions towards", country, None, None, None,
+                                                                    None, e),
+        "country data": lambda e: generate_country_data("Sanctions from", source, None, None, "2000-01-01", None, e),
+        "country page": lambda e: pd.DataFrame(load_page((f"SELECT * FROM entities_countries WHERE target_country = "
+                                                          f"%(c)s", {"c": country}), ["caption", "first_seen"], ["id"],
+                                                         [{"column_id": "first_seen", "direction": "desc"}], 3, 20,
+                                                         None, e)[0]),
+        "timeline": lambda e: read_sql(*timeline_query("Sanctions towards", country, None, None, "week",
+                                                       date(2018, 1, 1), True, date(2022, 3, 10)), e),
+        "network (cube)": lambda e: build_edge_list(None, None, None, None, None, e),
+        "network (raw)": lambda e: build_edge_list(None, None, "2010-01-01 12:00", None, None, e),
+        "entity search": lambda e: search_entity(None, query, None, e, index),
+        "filter options": lambda e: pd.DataFrame(filter_options("country", e)),
+    }
+
+
+def normalise(df: pd.DataFrame) -> pd.DataFrame:
+    # Row order of unordered queries and the dtypes (e.g. timestamp units) differ between the backends
+    df = df.astype(object).where(df.notna(), None).astype(str)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def timed(function: callable, engine, repeat: int) -> (pd.DataFrame, float):
+    timings: list[float] = []
+
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        df: pd.DataFrame = function(engine)
+        timings.append(time.perf_counter() - started)
+
+    return df, min(timings)
+
+
+def benchmark_snapshot(country: str = None, query: str = None, repeat: int = 3, directory: str = SNAPSHOT_DIR
+                       ) -> None:
+    # Every query is executed (the query cache is disabled)
+    query_cache.backend = None
+    postgres, snapshot = create_engine("benchmark"), SnapshotEngine(directory)
+
+    country = country or filter_options("target_country", postgres)[0]["value"]
+    source: str = filter_options("source_country", postgres)[0]["value"]
+    query = query or run_query("SELECT name FROM entity_names LIMIT 1", None, postgres)["name"][0].split(" ")[0]
+    index: EntitySearchIndex = EntitySearchIndex.load(postgres)
+    print(f"snapshot={snapshot.cursor() and snapshot.path} country={country} source={source} query={query}")
+
+    for name, function in tab_queries(country, source, query, index).items():
+        expected, postgres_time = timed(function, postgres, int(repeat))
+        result, snapshot_time = timed(function, snapshot, int(repeat))
+
+        parity: str = "OK" if normalise(expected).equals(normalise(result)) else "DIFFERENT"
+        print(f"{name:<20} rows={len(result):>8} parity={parity:<9} postgres={postgres_time:8.3f}s "
+              f"duckdb={snapshot_time:8.3f}s speed-up={postgres_time / snapshot_time:6.1f}x")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    benchmark_snapshot(**options)
@@ -0,0 +1,51 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter, so every measurement is a cold start
+PROBE: str = """
+import json, sys, time
+started = time.perf_counter()
+import dash, dash_bootstrap_components, dash_mantine_components
+framework = time.perf_counter()
+import flask, sqlalchemy.dialects.postgresql, psycopg2, diskcache, psutil, prometheus_client
+libraries = time.perf_counter()
+import dashboard
+imported = time.perf_counter()
+app = dashboard.create_app()
+created = time.perf_counter()
+checkouts = dashboard.pool_stats(dashboard.engine)["checkouts"]
+layout = app.server.test_client().get("/_dash-layout")
+served = time.perf_counter()
+heavy = [m for m in ["networkx", "scipy", "plotly.express", "xlsxwriter"] if m in sys.modules]
+print(json.dumps({"framework": framework - started, "libraries": libraries - started, "import": imported - started, "create_app": created - imported,
+                  "startup": created - started, "first_layout": served - created, "queries": checkouts,
+                  "status": layout.status_code, "heavy_imports": heavy}))
+"""
+
+
+def probe() -> dict:
+    output: str = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads(output.strip().split("\n")[-1])
+
+
+def benchmark_startup(repeat: int = 5) -> None:
+    runs: list[dict] = [probe() for _ in range(int(repeat))]
+
+    # framework: dash + components alone, libraries: with the server and database libraries (the floor without
+    # pandas), startup: import + create_app (no database queries)
+    for phase in ["framework", "libraries", "import", "create_app", "startup", "first_layout"]:
+        timings: list[float] = [run[phase] for run in runs]
+        print(f"{phase:<14} median={statistics.median(timings):7.3f}s min={min(timings):7.3f}s")
+
+    print(f"{'queries':<14} {runs[-1]['queries']} before the first page (pool checkouts)\n"
+          f"{'heavy imports':<14} {', '.join(runs[-1]['heavy_imports']) or 'none'}\n"
+          f"{'first layout':<14} HTTP {runs[-1]['status']}")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    benchmark_startup(**options)
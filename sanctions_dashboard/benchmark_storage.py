@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from tab_util.entity_search import search_query
+from tab_util.network import edge_list_query
+from tab_util.sanctions_by_country import country_data_query, country_aggregates_query
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+from DB import get_connection, config, ROOT_DIR
+
+REPORT_FILE: str = os.path.join(ROOT_DIR, "data", "benchmarks", "storage_report.md")
+LEGACY: str = "legacy"
+
+# The former layout (JSON columns, entities_countries with text dimensions), copied from the current tables
+LEGACY_TABLES: str = f"""
+    DROP SCHEMA IF EXISTS {LEGACY} CASCADE;
+    CREATE SCHEMA {LEGACY};
+
+    CREATE TABLE {LEGACY}.entities AS
+    SELECT id, caption, schema, properties::json AS properties, referents::json AS referents,
+        datasets::json AS datasets, first_seen, last_seen, last_change, target, industry, industry_confidence, deleted_at
+    FROM public.entities;
+    ALTER TABLE {LEGACY}.entities ADD PRIMARY KEY (id);
+
+    CREATE TABLE {LEGACY}.datasets AS
+    SELECT name, title, url, index_url, summary, description, publisher::json AS publisher, type FROM public.datasets;
+    ALTER TABLE {LEGACY}.datasets ADD PRIMARY KEY (name);
+
+    CREATE TABLE {LEGACY}.entities_countries (
+        id VARCHAR(255),
+        caption TEXT,
+        target_country varchar(8),
+        source_country varchar(8),
+        schema varchar(16),
+        first_seen timestamp,
+        last_seen timestamp,
+        last_change timestamp,
+        target boolean,
+        industry text
+    ) PARTITION BY LIST (source_country);
+    CREATE TABLE {LEGACY}.entities_countries_default PARTITION OF {LEGACY}.entities_countries DEFAULT;"""
+
+LEGACY_INDEXES: dict[str, list[str]] = {
+    "entities": ["id", "caption", "lower(caption)", "schema", "target", "industry", "first_seen"],
+    "datasets": ["name"],
+    "entities_countries": ["id", "caption", "lower(caption)", "schema", "target", "industry", "first_seen",
+                           "source_country", "target_country"],
+}
+
+# Relations of a table group in the current layout
+CURRENT_TABLES: dict[str, list[str]] = {
+    "entities": ["entities"],
+    "datasets": ["datasets"],
+    "entities_countries": ["entities_countries_data", "dim_countries", "dim_schemas", "dim_industries"],
+}
+
+
+def create_legacy(cursor) -> None:
+    cursor.execute(LEGACY_TABLES)
+
+    cursor.execute("SELECT DISTINCT source_country FROM entities_countries WHERE source_country ~ '^[a-z0-9_-]+$'")
+    for (country,) in cursor.fetchall():
+        cursor.execute(f"CREATE TABLE {LEGACY}.entities_countries_{country.replace('-', '_')} "
+                       f"PARTITION OF {LEGACY}.entities_countries FOR VALUES IN (%s)", (country,))
+
+    cursor.execute(f"""INSERT INTO {LEGACY}.entities_countries
+        SELECT ec.id, ec.caption, target_country, source_country, ec.schema, ec.first_seen, e.last_seen, e.last_change,
+            e.target, ec.industry
+        FROM entities_countries ec
+        JOIN entities e USING (id)""")
+
+    for table, columns in LEGACY_INDEXES.items():
+        for column in columns:
+            cursor.execute(f"CREATE INDEX ON {LEGACY}.{table} ({column})")
+
+    cursor.execute(f"ANALYZE {LEGACY}.entities, {LEGACY}.datasets, {LEGACY}.entities_countries")
+
+
+def relation_size(cursor, schema: str, relation: str) -> (int, int):
+    # Table (heap, TOAST, free space map) and index size, summed up over the partitions (pg_partition_tree is empty
+    # for tables that are not partitioned)
+    cursor.execute("""SELECT coalesce(sum(pg_table_size(relid)), 0), coalesce(sum(pg_indexes_size(relid)), 0)
+        FROM (SELECT relid FROM pg_partition_tree(%(r)s::regclass) UNION SELECT %(r)s::regclass) r""",
+                   {"r": f"{schema}.{relation}"})
+    return tuple(int(v) for v in cursor.fetchone())
+
+
+def legacy_sql(sql: str) -> str:
+    # The same query on the former layout: text instead of key comparisons, JSON instead of JSONB functions
+    sql = re.sub(r"(\w+)_id = \(SELECT id FROM dim_\w+ WHERE value = (%\(\w+\)s)\)", r"\1 = \2", sql)
+    return sql.replace("source_country_id != target_country_id", "source_country != target_country") \
+        .replace("jsonb_", "json_")
+
+
+def workload(cursor) -> dict[str, tuple[str, dict]]:
+    # The most sanctioned country, the largest sanctioning country and a frequent name
+    cursor.execute("SELECT target_country FROM entities_countries GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    target: str = cursor.fetchone()[0]
+    cursor.execute("SELECT source_country FROM entities_countries GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    source: str = cursor.fetchone()[0]
+    cursor.execute("SELECT caption FROM entities WHERE deleted_at IS NULL ORDER BY id LIMIT 1")
+    name: str = cursor.fetchone()[0].split()[0]
+
+    return {
+        f"country data (towards {target})": country_data_query("Sanctions towards", target, None, None, None, None),
+        f"country data (from {source}, Person)": country_data_query("Sanctions from", source, "Person", None,
+                                                                    "2018-01-01", None),
+        f"country aggregates (towards {target})": country_aggregates_query("Sanctions towards", target, None, None,
+                                                                           None, None),
+        f"country aggregates (from {source})": country_aggregates_query("Sanctions from", source, None, None, None,
+                                                                        None),
+        "edge list (raw)": edge_list_query(None, None, "2016-01-01 12:00", None, None),
+        f"entity search ({name}, from {source})": search_query(None, name, source),
+        "countries of the entities (JSON)": ("""SELECT count(*) FROM entities e,
+            jsonb_array_elements_text(COALESCE(e.properties->'country', e.properties->'jurisdiction')) c""", {}),
+        "names of the entities (JSON)": ("""SELECT count(*) FROM entities e, unnest(ARRAY['name', 'alias']) k,
+            jsonb_array_elements_text(e.properties->k) n""", {}),
+    }
+
+
+def measure(cursor, sql: str, params: dict, repeat: int) -> (float, int):
+    # Median wall time and the buffers (8 kB pages) the query touched
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+    plan: dict = cursor.fetchone()[0][0]["Plan"]
+    pages: int = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+
+    timings: list[float] = []
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings), pages
+
+
+def change(before: float, after: float) -> str:
+    return f"{after / before - 1:+.0%}" if before > 0 else ""
+
+
+def gin_index(cursor, repeat: int) -> list[str]:
+    # None of the queries filters on JSON containment, so no GIN index is created by the loaders.
+    # What an index on the entity properties would cost and buy
+    sql: str = "SELECT count(*) FROM entities WHERE properties @> %(p)s::jsonb"
+    params: dict = {"p": json.dumps({"country": ["ru"]})}
+    scan, _ = measure(cursor, sql, params, repeat)
+
+    started: float = time.perf_counter()
+    cursor.execute("CREATE INDEX entities_properties_gin ON entities USING gin (properties jsonb_path_ops)")
+    build: float = time.perf_counter() - started
+    cursor.execute("ANALYZE entities")
+    cursor.execute("SELECT pg_relation_size('entities_properties_gin')")
+    size: int = cursor.fetchone()[0]
+    indexed, _ = measure(cursor, sql, params, repeat)
+    cursor.execute("DROP INDEX entities_properties_gin")
+
+    return [f"| GIN (jsonb_path_ops) on entities.properties | {size / 2 ** 20:.1f} MB | {build:.2f}s | "
+            f"{scan * 1000:.1f} ms | {indexed * 1000:.1f} ms |"]
+
+
+def benchmark_storage(dsn: str = None, repeat: int = 5, output: str = REPORT_FILE, keep: bool = False) -> None:
+    # The former layout is copied into the schema "legacy" of the database (dropped afterwards unless keep=true)
+    repeat, keep = int(repeat), str(keep).lower() in ("1", "true", "yes")
+    if dsn is not None:
+        config["dsn"] = dsn
+
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    print(f"Copying the tables into the former layout (schema {LEGACY})")
+    create_legacy(cursor)
+
+    lines: list[str] = ["## Size", "",
+                        "| Table | Before: table | Before: indexes | After: table | After: indexes | Total |",
+                        "|---|---:|---:|---:|---:|---:|"]
+    for group, relations in CURRENT_TABLES.items():
+        before: tuple[int, int] = relation_size(cursor, LEGACY, group)
+        after: list[int] = [sum(sizes) for sizes in zip(*[relation_size(cursor, "public", r) for r in relations])]
+        lines.append(f"| {group} | {before[0] / 2 ** 20:.1f} MB | {before[1] / 2 ** 20:.1f} MB | "
+                     f"{after[0] / 2 ** 20:.1f} MB | {after[1] / 2 ** 20:.1f} MB | {change(sum(before), sum(after))} |")
+
+    lines += ["", f"## Queries (median of {repeat}, pages: 8 kB buffers touched)", "",
+              "| Query | Before | Before: pages | After | After: pages | Latency | Pages |",
+              "|---|---:|---:|---:|---:|---:|---:|"]
+    for name, (sql, params) in workload(cursor).items():
+        cursor.execute(f"SET search_path TO {LEGACY}, public")
+        before_time, before_pages = measure(cursor, legacy_sql(sql), params, repeat)
+        cursor.execute("SET search_path TO public")
+        after_time, after_pages = measure(cursor, sql, params, repeat)
+
+        lines.append(f"| {name} | {before_time * 1000:.1f} ms | {before_pages:,} | {after_time * 1000:.1f} ms | "
+                     f"{after_pages:,} | {change(before_time, after_time)} | {change(before_pages, after_pages)} |")
+
+    lines += ["", "## Optional indexes", "", "| Index | Size | Build | Without | With |", "|---|---:|---:|---:|---:|"]
+    lines += gin_index(cursor, repeat)
+
+    if not keep:
+        cursor.execute(f"DROP SCHEMA {LEGACY} CASCADE")
+    conn.close()
+
+    report: str = "\n".join(lines) + "\n"
+    print(report)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        f.write(report)
+    print(f"-> {output}")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    benchmark_storage(**options)
@@ -0,0 +1,191 @@
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from tab_util.cache import query_cache
+from tab_util.entity_search import search_entity
+from tab_util.network import build_edge_list, build_graph, get_centralises
+from tab_util.sanctions_by_country import generate_country_data, generate_country_aggregates, create_timeline
+from tab_util.search_index import EntitySearchIndex
+from tab_util.snapshot import SnapshotEngine, run_query
+
+UTIL_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util")
+sys.path.append(UTIL_DIR)
+from DB import create_engine, config, ROOT_DIR, SQL_DIR
+from GenerateSyntheticData import generate_synthetic_data, parse_scale
+
+DATA_DIR: str = os.path.join(ROOT_DIR, "data", "synthetic")
+RESULTS_FILE: str = os.path.join(ROOT_DIR, "data", "benchmarks", "results.jsonl")
+
+
+def ingest_stages(data: str) -> list[tuple[str, list[str]]]:
+    # The loader commands of the README, in order
+    return [
+        ("schema", ["DB.py", os.path.join(SQL_DIR, "schema.sql")]),
+        ("download_datasets", ["ParseOpenSanctionsData.py", "download_datasets", os.path.join(data, "index.json"),
+                               "offline=true"]),
+        ("write_entities", ["ParseOpenSanctionsData.py", "write_entities", os.path.join(data, "entities.ftm.json")]),
+        ("companies", ["ParserCompanySetData.py", "parser_company_set_data", os.path.join(data, "companies.csv")]),
+        ("countries", ["DB.py", os.path.join(SQL_DIR, "countries.sql")]),
+        ("name_index", ["MatchIndustries.py", "build_name_index"]),
+        ("match_industries", ["MatchIndustries.py", "match_industries"]),
+        ("index_and_joins", ["DB.py", os.path.join(SQL_DIR, "index_and_joins.sql")]),
+        ("entities_countries", ["BuildEntitiesCountries.py"]),
+        ("search", ["DB.py", os.path.join(SQL_DIR, "search.sql")]),
+        ("update_entities", ["ParseOpenSanctionsData.py", "update_entities",
+                             os.path.join(data, "entities.delta.ftm.json")]),
+        ("export_snapshot", ["ExportSnapshot.py"]),
+    ]
+
+
+def run_ingest(data: str, dsn: str) -> dict[str, float]:
+    env: dict = {**os.environ, "SANCTIONS_DSN": dsn, "SNAPSHOT_DIR": os.path.join(data, "snapshot")}
+    timings: dict[str, float] = {}
+
+    with open(os.path.join(data, "ingest.log"), "w") as log:
+        for name, command in ingest_stages(data):
+            started: float = time.perf_counter()
+            subprocess.run([sys.executable, *command], cwd=UTIL_DIR, env=env, stdout=log, stderr=log, check=True)
+            timings[name] = time.perf_counter() - started
+            print(f"  ingest   {name:<28} {timings[name]:9.3f}s")
+
+    return timings
+
+
+def tab_functions(engine, country: str, query: str) -> dict[str, callable]:
+    index: dict = {}
+
+    functions: dict[str, callable] = {
+        "generate_country_data": lambda: generate_country_data("Sanctions towards", country, None, None, None, None,
+                                                               engine),
+        "generate_country_aggregates": lambda: generate_country_aggregates("Sanctions towards", country, None, None,
+                                                                           None, None, engine),
+        "create_timeline": lambda: create_timeline("Sanctions towards", country, None, None, None, None, None, engine),
+        "build_edge_list": lambda: build_edge_list(None, None, None, None, None, engine),
+        "build_edge_list (raw)": lambda: build_edge_list(None, None, "2016-01-01 12:00", None, None, engine),
+        "get_centralises": lambda: get_centralises(build_graph(build_edge_list(None, None, None, None, None, engine))),
+        "search_entity": lambda: search_entity(None, query, None, engine),
+        "search_index_load": lambda: index.update(index=EntitySearchIndex.load(engine)),
+        "search_entity (index)": lambda: search_entity(None, query, None, engine, index["index"]),
+    }
+
+    # pg_trgm is not available in the snapshot, the dashboard always searches with the index there
+    if isinstance(engine, SnapshotEngine):
+        del functions["search_entity"]
+
+    return functions
+
+
+def run_tabs(engine, label: str, repeat: int, skip: set[str]) -> dict[str, float]:
+    # The most sanctioned country and a frequent name
+    country: str = run_query("""SELECT target_country FROM entities_countries GROUP BY 1 ORDER BY count(*) DESC
+        LIMIT 1""", None, engine)["target_country"][0]
+    query: str = run_query("SELECT caption FROM entities ORDER BY id LIMIT 1", None, engine)["caption"][0].split()[0]
+    timings: dict[str, float] = {}
+
+    for name, function in tab_functions(engine, country, query).items():
+        if name in skip:
+            continue
+
+        runs: list[float] = []
+        for _ in range(repeat):
+            started: float = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - started)
+
+        timings[name] = statistics.median(runs)
+        print(f"  {label:<8} {name:<28} {timings[name]:9.3f}s")
+
+    return timings
+
+
+def load_results(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results: list[dict], previous: list[dict], threshold: float, noise: float) -> int:
+    # The last earlier measurement of the same scale, group (ingest or the tab backend) and stage
+    baseline: dict = {(r["scale"], r["group"], r["name"]): r for r in previous}
+    regressions: int = 0
+
+    for r in results:
+        before: [dict, None] = baseline.get((r["scale"], r["group"], r["name"]))
+        if before is None:
+            continue
+
+        change: float = r["seconds"] / max(before["seconds"], 1e-9) - 1
+        regression: bool = change > threshold and r["seconds"] - before["seconds"] > noise
+        regressions += regression
+        print(f"{r['scale']:>6} {r['group']:<9} {r['name']:<28} {before['seconds']:9.3f}s -> {r['seconds']:9.3f}s "
+              f"{change:+7.1%}{'  REGRESSION (' + before['commit'] + ')' if regression else ''}")
+
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def benchmark_suite(dsn: str, scales: str = "10k", repeat: int = 3, backends: str = "postgres", ingest: bool = True,
+                    data: str = DATA_DIR, results: str = RESULTS_FILE, threshold: float = 0.2, noise: float = 0.05,
+                    skip: str = "") -> int:
+    # The ingest drops and recreates all tables: dsn has to point to a scratch database
+    ingest = str(ingest).lower() in ("1", "true", "yes")
+    repeat, threshold, noise = int(repeat), float(threshold), float(noise)
+    config["dsn"] = dsn
+
+    # Every tab query is executed (the query cache is disabled)
+    query_cache.backend = None
+    run: str = datetime.datetime.now().isoformat(timespec="seconds")
+    measurements: list[dict] = []
+
+    for scale in scales.split(","):
+        directory: str = os.path.join(data, scale)
+        print(f"scale {scale} ({directory})")
+
+        if not os.path.exists(os.path.join(directory, "entities.ftm.json")):
+            generate_synthetic_data(directory, scale)
+
+        stages: list[tuple[str, str, float]] = []
+        if ingest:
+            stages += [("ingest", name, seconds) for name, seconds in run_ingest(directory, dsn).items()]
+
+        for backend in backends.split(","):
+            engine = SnapshotEngine(os.path.join(directory, "snapshot")) if backend == "duckdb" else \
+                create_engine("benchmark")
+            timings: dict[str, float] = run_tabs(engine, backend, repeat, set(skip.split(",")))
+            stages += [(backend, name, seconds) for name, seconds in timings.items()]
+            engine.dispose()
+
+        measurements += [{"run": run, "commit": git_commit(), "scale": scale, "entities": parse_scale(scale),
+                          "group": group, "name": name, "seconds": round(seconds, 4)}
+                         for group, name, seconds in stages]
+
+    previous: list[dict] = load_results(results)
+    print("\nCompared to the previous run:")
+    regressions: int = compare(measurements, previous, threshold, noise)
+
+    os.makedirs(os.path.dirname(results), exist_ok=True)
+    with open(results, "a") as f:
+        f.writelines(json.dumps(m) + "\n" for m in measurements)
+
+    print(f"\n{len(measurements)} measurements appended to {results}, {regressions} regression(s) "
+          f"(> {threshold:.0%} and > {noise}s slower)")
+    return regressions
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    exit(1 if benchmark_suite(**options) > 0 else 0)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import diskcache
+import psutil
+from dash import DiskcacheManager
+from sqlalchemy import Engine
+
+from tab_util.metrics import job_finished
+
+# BACKGROUND_CACHE_DIR=<job queue directory>, BACKGROUND_LIMIT_<KIND>=<concurrent jobs of this kind>,
+# BACKGROUND_QUEUE_TIMEOUT=<seconds a job waits for a slot>
+BACKGROUND_CACHE_DIR: str = os.environ.get("BACKGROUND_CACHE_DIR",
+                                           os.path.join(tempfile.gettempdir(), "sanctions_dashboard_jobs"))
+BACKGROUND_LIMITS: dict[str, int] = {kind: int(os.environ.get(f"BACKGROUND_LIMIT_{kind.upper()}", limit))
+                                     for kind, limit in [("network", 2), ("export", 2)]}
+SLOT_EXPIRE: int = 30 * 60
+QUEUE_TIMEOUT: float = float(os.environ.get("BACKGROUND_QUEUE_TIMEOUT", 120))
+
+jobs: diskcache.Cache = diskcache.Cache(BACKGROUND_CACHE_DIR)
+background_manager: DiskcacheManager = DiskcacheManager(jobs)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def acquire_slot(kind: str) -> [str, None]:
+    for i in range(BACKGROUND_LIMITS[kind]):
+        slot: str = f"slot-{kind}-{i}"
+
+        if jobs.add(slot, os.getpid(), expire=SLOT_EXPIRE):
+            return slot
+
+        # Cancelled jobs are killed without releasing their slot
+        holder: [int, None] = jobs.get(slot)
+        if holder is not None and not psutil.pid_exists(holder):
+            jobs.delete(slot)
+
+            if jobs.add(slot, os.getpid(), expire=SLOT_EXPIRE):
+                return slot
+
+    return None
+
+
+@contextmanager
+def limited(kind: str, set_progress: callable, engine: Engine):
+    # Jobs run in a forked process, the inherited pool connections belong to the parent
+    engine.dispose(close=False)
+
+    # diskcache's Lock/ BoundedSemaphore poll as well (and never reclaim the slots of killed jobs), so the slots are
+    # polled until the deadline
+    deadline: float = time.monotonic() + QUEUE_TIMEOUT
+    slot: [str, None] = acquire_slot(kind)
+
+    try:
+        while slot is None:
+            if time.monotonic() >= deadline:
+                raise QueueFull(f"Too many {kind} jobs are running, please try again later")
+
+            set_progress((0, "Queued"))
+            time.sleep(0.5)
+            slot = acquire_slot(kind)
+
+        yield
+    finally:
+        if slot is not None and jobs.get(slot) == os.getpid():
+            jobs.delete(slot)
+
+        job_finished()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from sqlalchemy import Engine
+
+from tab_util.snapshot import run_query
+
+
+# LRU dictionary of the current process
+class MemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, key: str, ttl: float):
+        with self.lock:
+            if key not in self.entries:
+                return None
+
+            stored, value = self.entries[key]
+            if time.time() - stored > ttl:
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> int:
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+
+            evicted: int = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+
+            return evicted
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+# Pickle files in a directory shared by all worker processes, the modification time tracks the last access (LRU)
+class FileBackend:
+    def __init__(self, directory: str, max_entries: int):
+        self.directory: str = directory
+        self.max_entries: int = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str, ttl: float):
+        try:
+            with open(self.path(key), "rb") as f:
+                stored, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if time.time() - stored > ttl:
+            return None
+
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+        return value
+
+    def set(self, key: str, value) -> int:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((time.time(), value), f)
+        os.replace(tmp, self.path(key))
+
+        files: list[os.DirEntry] = [e for e in os.scandir(self.directory) if e.name.endswith(".pkl")]
+        if len(files) <= self.max_entries:
+            return 0
+
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+        return len(files) - self.max_entries
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+
+# Query results keyed on the SQL, its (used) parameters and the snapshot version of the database.
+# The loaders increase the version (table snapshot) when they finish, which invalidates all cached results
+class QueryCache:
+    def __init__(self, backend: [MemoryBackend, FileBackend, None], ttl: float = 600, version_interval: float = 5):
+        self.backend: [MemoryBackend, FileBackend, None] = backend
+        self.ttl: float = ttl
+        self.version_interval: float = version_interval
+        self.version: [int, None] = None
+        self.version_checked: float = 0
+        self.counters: dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def snapshot_version(self, engine: Engine) -> int:
+        if time.monotonic() - self.version_checked > self.version_interval:
+            self.version = int(run_query("SELECT max(version) AS version FROM snapshot", None, engine)["version"][0])
+            self.version_checked = time.monotonic()
+
+        return self.version
+
+    def key(self, namespace: str, content, engine: Engine) -> str:
+        payload: str = json.dumps([namespace, self.snapshot_version(engine), content], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get_or_compute(self, key: str, compute: callable):
+        if self.backend is None:
+            return compute()
+
+        value = self.backend.get(key, self.ttl)
+
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+
+        self.counters["misses"] += 1
+        value = compute()
+        self.counters["evictions"] += self.backend.set(key, value)
+        return value
+
+    def read_sql(self, sql: str, params: [dict, None], engine: Engine) -> pd.DataFrame:
+        # Only the parameters referenced by the statement distinguish results (unused filters are None or "")
+        used: dict = {k: v for k, v in (params or {}).items() if f"%({k})s" in sql}
+        key: str = self.key("sql", [re.sub(r"\s+", " ", sql), used], engine)
+
+        return self.get_or_compute(key, lambda: run_query(sql, params, engine)).copy()
+
+    def memoise(self, namespace: str, content: str, compute: callable, engine: Engine):
+        return self.get_or_compute(self.key(namespace, content, engine), compute)
+
+    def stats(self) -> dict:
+        lookups: int = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_rate": self.counters["hits"] / lookups if lookups > 0 else None,
+                "snapshot": self.version, "backend": type(self.backend).__name__ if self.backend else None}
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def create_cache(backend: str = "memory", max_entries: int = 256, ttl: float = 600, directory: str = None
+                 ) -> QueryCache:
+    if backend == "file":
+        directory = directory or os.path.join(tempfile.gettempdir(), "sanctions_dashboard_cache")
+        return QueryCache(FileBackend(directory, max_entries), ttl)
+
+    return QueryCache(MemoryBackend(max_entries) if backend == "memory" else None, ttl)
+
+
+# QUERY_CACHE=memory|file|off, QUERY_CACHE_SIZE=<entries>, QUERY_CACHE_TTL=<seconds>, QUERY_CACHE_DIR=<file backend>
+query_cache: QueryCache = create_cache(os.environ.get("QUERY_CACHE", "memory"),
+                                       int(os.environ.get("QUERY_CACHE_SIZE", 256)),
+                                       float(os.environ.get("QUERY_CACHE_TTL", 600)),
+                                       os.environ.get("QUERY_CACHE_DIR"))
+
+
+def read_sql(sql: str, params: [dict, None], engine: Engine) -> pd.DataFrame:
+    return query_cache.read_sql(sql, params, engine)
+
+
+def memoise(namespace: str, content: str, compute: callable, engine: Engine):
+    return query_cache.memoise(namespace, content, compute, engine)
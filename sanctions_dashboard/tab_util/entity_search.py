@@ -1,39 +1,88 @@
 import pandas as pd
 from sqlalchemy import Engine
 
+from tab_util.search_index import EntitySearchIndex
+from tab_util.cache import read_sql
+from tab_util.util import load_page, dimension_condition
 
-def search_entity(schema: str, query: str, country: str, engine: Engine) -> pd.DataFrame:
+SEARCH_COLUMNS: list[str] = ["Title", "Country", "First Seen", "Last Seen", "Last Change", "Datasets", "Relevance"]
+SEARCH_LIMIT: int = 1000
+
+# exact name > prefix > substring > trigram similarity (pg_trgm, see sql/search.sql)
+RANK: str = """CASE WHEN lower(n.name) = lower(%(query)s) THEN 3
+            WHEN lower(n.name) LIKE concat(lower(%(query)s), '%%') THEN 2 + similarity(lower(n.name), lower(%(query)s))
+            WHEN lower(n.name) LIKE concat('%%', lower(%(query)s), '%%') THEN 1 + similarity(lower(n.name), lower(%(query)s))
+            ELSE similarity(lower(n.name), lower(%(query)s)) END"""
+
+DATASET_LABEL: str = "CONCAT(ed.title, CASE WHEN ed.flag IS NULL THEN '' ELSE CONCAT(' (', ed.flag, ')') END)"
+
+
+def search_query(schema: str, query: str, country: str, limit: int = SEARCH_LIMIT,
+                 index: [EntitySearchIndex, None] = None) -> [tuple[str, dict], None]:
     if query is None or len(query.strip()) == 0:
-        return pd.DataFrame()
+        return None
 
     country_join: str = ""
-    restriction: list[str] = ["LOWER(caption) LIKE concat('%%', LOWER(%(query)s) ,'%%')"]
+    restriction: list[str] = ["deleted_at IS NULL"]
+    params: dict = {"schema": schema, "query": query.strip(), "country": country, "limit": limit}
 
     if schema is not None and schema.strip() != "":
         restriction.append("schema = %(schema)s")
 
     if country is not None and country.strip() != "":
-        country_join = "JOIN (SELECT id FROM entities_countries WHERE source_country = %(country)s) ec USING (id)"
+        country_join = f"""JOIN (SELECT DISTINCT id FROM entities_countries 
+            WHERE {dimension_condition("source_country", "country")}) ec USING (id)"""
+
+    if index is not None:
+        # ranked in process, the database only resolves the ids
+        params["ids"], params["ranks"] = index.search(query, limit, schema if schema else None)
+        matches: str = "SELECT unnest(%(ids)s::text[]) AS id, unnest(%(ranks)s::float8[]) AS rank"
+    else:
+        matches: str = f"""SELECT n.id, max({RANK}) AS rank
+            FROM entity_names n
+            JOIN entities USING (id)
+            {country_join}
+            WHERE {" AND ".join(restriction)} 
+                AND (lower(n.name) LIKE concat('%%', lower(%(query)s), '%%') OR lower(n.name) %% lower(%(query)s))
+            GROUP BY n.id
+            ORDER BY rank DESC
+            LIMIT %(limit)s"""
 
-    sql: str = f"""SELECT caption, country_descr, e.first_seen, e.last_seen, e.last_change, 
-        STRING_AGG(DISTINCT CONCAT(d.title, CASE WHEN flag IS NULL THEN '' ELSE CONCAT(' (', flag, ')') END), '\n') AS datasets
+    sql: str = f"""WITH matches AS ({matches})
+        SELECT caption AS "Title", country_descr AS "Country", e.first_seen AS "First Seen", 
+            e.last_seen AS "Last Seen", e.last_change AS "Last Change", 
+            STRING_AGG(DISTINCT {DATASET_LABEL}, '\n' ORDER BY {DATASET_LABEL}) AS "Datasets",
+            round(max(rank)::numeric, 3) AS "Relevance"
         FROM (
-            SELECT DISTINCT id, caption, first_seen, last_seen, last_change, json_array_elements_text(datasets) AS name
+            SELECT id, caption, first_seen::date AS first_seen, last_seen::date AS last_seen, 
+                last_change::date AS last_change, rank
             FROM entities 
+            JOIN matches USING (id)
             {country_join}
             WHERE {" AND ".join(restriction)}
         ) e
+        JOIN entity_datasets ed ON (ed.entity_id = e.id AND ed.title IS NOT NULL)
         LEFT JOIN (SELECT id, target_country FROM entities_countries) ec USING (id)
         LEFT JOIN (SELECT alpha_2 AS target_country, description AS country_descr FROM countries) c USING (target_country)
-        JOIN datasets d USING (name)
-        LEFT JOIN (SELECT alpha_2, flag FROM countries) c2 ON (d.publisher->>'country' = c2.alpha_2)
         GROUP BY 1,2,3,4,5"""
 
-    df: pd.DataFrame = pd.read_sql(sql, params={"schema": schema, "query": query, "country": country}, con=engine)
+    return sql, params
+
+
+def search_entity(schema: str, query: str, country: str, engine: Engine,
+                  index: [EntitySearchIndex, None] = None) -> pd.DataFrame:
+    search: [tuple[str, dict], None] = search_query(schema, query, country, index=index)
+
+    if search is None:
+        return pd.DataFrame()
+
+    return read_sql(search[0], search[1], engine)
+
 
-    df['first_seen'] = pd.to_datetime(df['first_seen']).dt.date
-    df['last_seen'] = pd.to_datetime(df['last_seen']).dt.date
-    df['last_change'] = pd.to_datetime(df['last_change']).dt.date
+def search_entity_page(schema: str, query: str, country: str, sort_by: list[dict], page_current: int, page_size: int,
+                       state: dict, engine: Engine, index: [EntitySearchIndex, None] = None) -> (list[dict], int, int, dict):
+    if sort_by is None or len(sort_by) == 0:
+        sort_by = [{"column_id": "Relevance", "direction": "desc"}]
 
-    return df.rename(columns={"caption": "Title", "country_descr": "Country", "datasets": "Datasets",
-                              "first_seen": "First Seen", "last_seen": "Last Seen", "last_change": "Last Change"})
+    return load_page(search_query(schema, query, country, index=index), SEARCH_COLUMNS, SEARCH_COLUMNS[:5], sort_by,
+                     page_current, page_size, state, engine)
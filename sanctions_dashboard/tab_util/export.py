@@ -0,0 +1,142 @@
+import csv
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Iterator
+
+import pandas as pd
+from sqlalchemy import Engine
+
+from tab_util.metrics import phase
+from tab_util.snapshot import SnapshotEngine
+
+# EXPORT_DIR=<directory of the finished exports>, EXPORT_TTL=<seconds until an export is deleted>
+EXPORT_DIR: str = os.environ.get("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "sanctions_dashboard_exports"))
+EXPORT_TTL: int = int(os.environ.get("EXPORT_TTL", 60 * 60))
+EXPORT_FORMATS: list[str] = ["xlsx", "csv", "parquet"]
+CHUNK_SIZE: int = 10_000
+EXCEL_MAX_ROWS: int = 1_048_576
+
+
+def stream_query(sql: str, params: dict, engine: [Engine, SnapshotEngine], chunk_size: int = CHUNK_SIZE
+                 ) -> Iterator[pd.DataFrame]:
+    if isinstance(engine, SnapshotEngine):
+        yield from engine.stream(sql, params, chunk_size)
+        return
+
+    # stream_results fetches the rows through a server side (named) cursor instead of loading them all at once
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_size) as conn:
+        yield from pd.read_sql(sql, params=params, con=conn, chunksize=chunk_size)
+
+
+def excel_width(series: pd.Series) -> float:
+    return min(max([len(str(series.name))] + [len(str(v)) for v in series.head(1000)]) + 2, 80)
+
+
+# The writers import their libraries on first use, they are not needed to start the dashboard
+def write_xlsx(chunks: Iterator[pd.DataFrame], path: str, sheet_name: str, progress: callable) -> int:
+    import xlsxwriter
+
+    # constant_memory flushes every row once the next one is started, so the rows have to be written in order
+    workbook: xlsxwriter.Workbook = xlsxwriter.Workbook(path, {"constant_memory": True,
+                                                               "default_date_format": "yyyy-mm-dd hh:mm:ss",
+                                                               "nan_inf_to_errors": True})
+    worksheet, sheets, row, rows = None, 0, EXCEL_MAX_ROWS, 0
+
+    for chunk in chunks:
+        for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            # Excel sheets are limited to 1,048,576 rows, the export continues on another sheet
+            if row == EXCEL_MAX_ROWS:
+                sheets += 1
+                worksheet = workbook.add_worksheet(sheet_name if sheets == 1 else f"{sheet_name} ({sheets})")
+                for col, name in enumerate(chunk.columns):
+                    worksheet.set_column(col, col, excel_width(chunk[name]))
+                worksheet.write_row(0, 0, list(chunk.columns))
+                row = 1
+
+            worksheet.write_row(row, 0, values)
+            row += 1
+
+        rows += len(chunk)
+        progress(rows)
+
+    if worksheet is None:
+        workbook.add_worksheet(sheet_name)
+
+    workbook.close()
+    return rows
+
+
+def write_csv(chunks: Iterator[pd.DataFrame], path: str, progress: callable) -> int:
+    rows: int = 0
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=rows == 0, quoting=csv.QUOTE_MINIMAL)
+            rows += len(chunk)
+            progress(rows)
+
+    return rows
+
+
+def write_parquet(chunks: Iterator[pd.DataFrame], path: str, progress: callable) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, rows = None, 0
+
+    for chunk in chunks:
+        table: pa.Table = pa.Table.from_pandas(chunk, preserve_index=False)
+
+        if writer is None:
+            # Columns that are empty in the first chunk have no type yet
+            schema: pa.Schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                           for f in table.schema]).remove_metadata()
+            writer = pq.ParquetWriter(path, schema)
+
+        writer.write_table(table.cast(writer.schema))
+        rows += len(chunk)
+        progress(rows)
+
+    if writer is not None:
+        writer.close()
+    else:
+        pq.write_table(pa.table({}), path)
+
+    return rows
+
+
+def remove_expired() -> None:
+    if not os.path.isdir(EXPORT_DIR):
+        return
+
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_dir() and time.time() - entry.stat().st_mtime > EXPORT_TTL:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def export_query(query: [tuple[str, dict], None], fmt: str, name: str, engine: Engine, sheet_name: str = "Export",
+                 progress: callable = lambda rows: None) -> (str, int):
+    remove_expired()
+
+    fmt = fmt if fmt in EXPORT_FORMATS else "xlsx"
+    token: str = uuid.uuid4().hex
+    filename: str = f"{re.sub(r'[^a-z0-9_-]+', '_', name.lower())}.{fmt}"
+    path: str = os.path.join(EXPORT_DIR, token, filename)
+    os.makedirs(os.path.dirname(path))
+
+    chunks: Iterator[pd.DataFrame] = iter([]) if query is None else stream_query(query[0], query[1], engine)
+
+    # The chunks are fetched while they are written
+    with phase("export"):
+        if fmt == "xlsx":
+            rows: int = write_xlsx(chunks, path, sheet_name[:31], progress)
+        elif fmt == "csv":
+            rows: int = write_csv(chunks, path, progress)
+        else:
+            rows: int = write_parquet(chunks, path, progress)
+
+    return f"{token}/{filename}", rows
@@ -0,0 +1,196 @@
+import datetime
+import functools
+import inspect
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Background callbacks run in forked processes: their samples are written to memory mapped files (one per process)
+# in PROMETHEUS_MULTIPROC_DIR and summed up by /metrics. The worker processes and background jobs share the directory,
+# it is cleared when the dashboard starts (clear_metrics). The launcher sets it before prometheus_client is imported
+# (see dashboard.py), without it the samples stay in the memory of the process (benchmarks, loaders)
+METRICS_DIR: [str, None] = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+from flask import g, has_request_context, request, Response
+from prometheus_client import CollectorRegistry, Histogram, Counter, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+
+# SLOW_LOG=<file> appends queries slower than SLOW_QUERY_SECONDS=1 and callbacks slower than
+# SLOW_CALLBACK_SECONDS=3 with their parameters (filters) as JSON lines
+SLOW_LOG: [str, None] = os.environ.get("SLOW_LOG")
+SLOW_QUERY_SECONDS: float = float(os.environ.get("SLOW_QUERY_SECONDS", 1))
+SLOW_CALLBACK_SECONDS: float = float(os.environ.get("SLOW_CALLBACK_SECONDS", 3))
+
+SECONDS: tuple = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+ROWS: tuple = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES: tuple = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+CALLBACK_SECONDS: Histogram = Histogram("dashboard_callback_seconds", "Wall time of the Dash callbacks",
+                                        ["callback"], buckets=SECONDS)
+PHASE_SECONDS: Histogram = Histogram("dashboard_callback_phase_seconds",
+                                     "Wall time of the phases of a callback (query, transform, layout, centrality, "
+                                     "figure, serialise), without the nested phases", ["callback", "phase"],
+                                     buckets=SECONDS)
+CALLBACK_ERRORS: Counter = Counter("dashboard_callback_errors", "Callbacks that raised an exception", ["callback"])
+PAYLOAD_BYTES: Histogram = Histogram("dashboard_callback_payload_bytes", "Size of the callback responses",
+                                     ["callback"], buckets=BYTES)
+QUERY_SECONDS: Histogram = Histogram("dashboard_query_seconds", "Wall time of the executed (not cached) queries",
+                                     ["callback", "backend"], buckets=SECONDS)
+QUERY_ROWS: Histogram = Histogram("dashboard_query_rows", "Rows returned by the executed queries",
+                                  ["callback", "backend"], buckets=ROWS)
+
+
+def clear_metrics() -> None:
+    # The samples of previous runs (before the worker processes are started)
+    if METRICS_DIR is None:
+        return
+
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def job_finished() -> None:
+    # The process of a background job exits after the job: its live gauges are removed, its counters and histograms
+    # stay summed up until the directory is cleared
+    if METRICS_DIR is not None:
+        mark_process_dead(os.getpid())
+
+
+# The phases of the running callback, a phase only counts the time of its nested phases once (in the nested one)
+class Trace:
+    def __init__(self, callback: str):
+        self.callback: str = callback
+        self.phases: dict[str, float] = {}
+        self.nested: list[float] = []
+
+
+trace: ContextVar[[Trace, None]] = ContextVar("trace", default=None)
+
+
+def current_callback() -> str:
+    return trace.get().callback if trace.get() is not None else "none"
+
+
+@contextmanager
+def phase(name: str):
+    current: [Trace, None] = trace.get()
+    if current is None:
+        yield
+        return
+
+    started: float = time.perf_counter()
+    current.nested.append(0)
+
+    try:
+        yield
+    finally:
+        elapsed: float = time.perf_counter() - started
+        nested: float = current.nested.pop()
+        current.phases[name] = current.phases.get(name, 0) + elapsed - nested
+
+        if current.nested:
+            current.nested[-1] += elapsed
+
+
+def json_parameters(values: dict) -> dict:
+    # Filters as they were selected, the progress callback and large states (page keys) are left out
+    return {k: v for k, v in values.items()
+            if not callable(v) and len(json.dumps(v, default=str)) <= 1000}
+
+
+def log_slow(kind: str, seconds: float, **fields) -> None:
+    if SLOW_LOG is None:
+        return
+
+    line: str = json.dumps({"time": datetime.datetime.now().isoformat(timespec="seconds"), "kind": kind,
+                            "callback": current_callback(), "seconds": round(seconds, 3), **fields}, default=str)
+    try:
+        with open(SLOW_LOG, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Slow log {SLOW_LOG}: {e}", file=sys.stderr)
+
+
+def observe_query(sql: str, params: [dict, None], backend: str, seconds: float, rows: int) -> None:
+    QUERY_SECONDS.labels(current_callback(), backend).observe(seconds)
+    QUERY_ROWS.labels(current_callback(), backend).observe(rows)
+
+    if seconds > SLOW_QUERY_SECONDS:
+        used: dict = {k: v for k, v in (params or {}).items() if f"%({k})s" in sql}
+        log_slow("query", seconds, rows=rows, sql=re.sub(r"\s+", " ", sql).strip(), params=used)
+
+
+def traced(function: callable) -> callable:
+    # Applied below @callback: the total time, the phases and slow calls (with the filters) of a callback
+    name: str = function.__name__
+    signature: inspect.Signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        current: Trace = Trace(name)
+        token = trace.set(current)
+        started: float = time.perf_counter()
+
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            CALLBACK_ERRORS.labels(name).inc()
+            raise
+        finally:
+            seconds: float = time.perf_counter() - started
+            trace.reset(token)
+
+            CALLBACK_SECONDS.labels(name).observe(seconds)
+            # Python code outside a phase (e.g. building the outputs) is reported as "other"
+            current.phases["other"] = max(seconds - sum(current.phases.values()), 0)
+            for phase_name, phase_seconds in current.phases.items():
+                PHASE_SECONDS.labels(name, phase_name).observe(phase_seconds)
+
+            if seconds > SLOW_CALLBACK_SECONDS:
+                log_slow("callback", seconds, callback=name, phases={k: round(v, 4) for k, v in current.phases.items()},
+                         params=json_parameters(signature.bind(*args, **kwargs).arguments))
+
+            # The response is serialised by Dash after the callback returned (see instrument_server)
+            if has_request_context():
+                g.callback_seconds = seconds
+
+    return wrapper
+
+
+def instrument_server(app) -> None:
+    # Serialisation time (the callback request without the callback itself) and payload size of the responses.
+    # Background callbacks are polled, their result is serialised by a request that does not run the callback
+    @app.server.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+
+    @app.server.after_request
+    def observe_response(response: Response) -> Response:
+        if not request.path.endswith("/_dash-update-component") or "request_started" not in g:
+            return response
+
+        body: dict = request.get_json(silent=True) or {}
+        callback: [dict, None] = app.callback_map.get(body.get("output"))
+        name: str = callback["callback"].__name__ if callback is not None else "unknown"
+
+        seconds: float = time.perf_counter() - g.request_started - g.get("callback_seconds", 0)
+        PHASE_SECONDS.labels(name, "serialise").observe(max(seconds, 0))
+        if not response.is_streamed:
+            PAYLOAD_BYTES.labels(name).observe(response.calculate_content_length() or 0)
+
+        return response
+
+    # Prometheus text format of all processes (workers and background jobs sharing PROMETHEUS_MULTIPROC_DIR)
+    @app.server.route("/metrics")
+    def metrics():
+        registry: CollectorRegistry = REGISTRY
+        if METRICS_DIR is not None:
+            registry = CollectorRegistry()
+            MultiProcessCollector(registry)
+
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
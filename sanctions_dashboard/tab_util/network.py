@@ -1,3 +1,6 @@
+import hashlib
+import os
+
 import numpy as np
 import plotly.graph_objs as go
 import networkx as nx
@@ -5,37 +8,67 @@ import plotly.express as px
 import pandas as pd
 from sqlalchemy import Engine
 
+from tab_util.cache import read_sql, memoise
+from tab_util.centrality import sparse_centralises
+from tab_util.metrics import phase
+from tab_util.util import paginate_frame, dimension_condition
+
+LAYOUT_SEED: int = 42
+
+# sparse: scipy sparse matrix engine (tab_util.centrality), networkx: reference implementation
+CENTRALITY_ENGINE: str = os.environ.get("CENTRALITY_ENGINE", "sparse")
+
+# webgl: edges packed into a few Scattergl traces (by weight bucket), traces: one Scatter per edge
+NETWORK_RENDERING: str = os.environ.get("NETWORK_RENDERING", "webgl")
+EDGE_BUCKETS: int = 5
+
+
+def is_day(value: str) -> bool:
+    return value is None or len(value) in (0, 10)
 
-def build_edge_list(schema: str, industry: str, start_date: str, end_date: str, countries: str, engine: Engine
-                    ) -> pd.DataFrame:
-    conditions: list[str] = ["source_country != target_country"]
+
+def edge_list_query(schema: str, industry: str, start_date: str, end_date: str, countries: str) -> (str, dict):
+    # The pre-aggregated cube has a resolution of one day, finer date filters have to use the raw table
+    cube: bool = is_day(start_date) and is_day(end_date)
+    # The raw table compares the keys of its dictionary encoded columns
+    conditions: list[str] = ["source_country != target_country" if cube else "source_country_id != target_country_id"]
 
     if schema is not None and schema != "":
-        conditions.append('schema = %(s)s')
+        conditions.append('schema = %(s)s' if cube else dimension_condition("schema", "s"))
 
     if industry is not None and industry != "":
-        conditions.append('industry = %(i)s')
+        conditions.append('industry = %(i)s' if cube else dimension_condition("industry", "i"))
 
     if start_date is not None and start_date != "":
-        conditions.append('first_seen > %(sd)s')
+        conditions.append('(first_seen > %(sd)s OR (first_seen = %(sd)s AND NOT at_midnight))' if cube else
+                          'first_seen > %(sd)s')
 
     if end_date is not None and end_date != "":
         conditions.append('first_seen < %(ed)s')
 
     if countries is not None and countries != "":
-        countries = ", ".join(map(lambda x: f"'{x}'", countries))
-        conditions.append(f'source_country IN ({countries}) AND target_country IN ({countries})')
+        conditions.append('source_country = ANY(%(c)s) AND target_country = ANY(%(c)s)')
 
     condition: str = ' AND '.join(conditions)
 
-    sql: str = f"""SELECT s.description AS source, t.description AS target, count(DISTINCT id) AS weight 
-    FROM entities_countries 
+    sql: str = f"""SELECT s.description AS source, t.description AS target, 
+        {"sum(entities)::bigint" if cube else "count(DISTINCT id)"} AS weight 
+    FROM {"network_cube" if cube else "entities_countries"} 
     JOIN countries s ON (s.alpha_2 = source_country) 
     JOIN countries t ON (t.alpha_2 = target_country)  
     WHERE {condition}
-    GROUP BY 1, 2"""
+    GROUP BY 1, 2
+    ORDER BY 1, 2"""
+
+    params: dict = {"s": schema, "i": industry, "sd": start_date, "ed": end_date, "c": countries}
 
-    return pd.read_sql(sql, params={"s": schema, "i": industry, "sd": start_date, "ed": end_date}, con=engine)
+    return sql, params
+
+
+def build_edge_list(schema: str, industry: str, start_date: str, end_date: str, countries: str, engine: Engine
+                    ) -> pd.DataFrame:
+    sql, params = edge_list_query(schema, industry, start_date, end_date, countries)
+    return read_sql(sql, params, engine)
 
 
 def build_graph(df) -> nx.DiGraph:
@@ -45,23 +78,116 @@ def build_graph(df) -> nx.DiGraph:
     return graph
 
 
-def build_output(schema: str, industry: str, start_date: str, end_date: str, countries: str, engine: Engine
-                 ) -> (go.Figure, pd.DataFrame):
+def edge_list_hash(df: pd.DataFrame) -> str:
+    # Different filters can yield the same graph, layout and centralities are keyed on the edges themselves
+    edges: pd.DataFrame = df.sort_values(["source", "target"]).reset_index(drop=True)
+    return hashlib.sha256(pd.util.hash_pandas_object(edges, index=False).values.tobytes()).hexdigest()
+
+
+def network_layout(graph: nx.DiGraph, edges: str, engine: Engine) -> dict:
+    with phase("layout"):
+        return memoise("layout", edges, lambda: nx.spring_layout(graph, weight='weight', seed=LAYOUT_SEED), engine)
+
+
+def network_centralises(graph: nx.DiGraph, edges: str, engine: Engine) -> pd.DataFrame:
+    with phase("centrality"):
+        return memoise("centralises", edges, lambda: get_centralises(graph), engine)
+
+
+def message_figure(text: str, title: str = None) -> go.Figure:
+    fig = px.scatter(title=title)
+    fig.update_layout(annotations=[
+        dict(x=0.5, y=0.5, xref="paper", yref="paper", text=text, showarrow=False, font=dict(size=20), )])
+    return fig
+
+
+def build_output(schema: str, industry: str, start_date: str, end_date: str, countries: str, engine: Engine,
+                 progress: callable = lambda percent, label: None) -> go.Figure:
+    progress(10, "Loading edges")
     df = build_edge_list(schema, industry, start_date, end_date, countries, engine)
-    graph = build_graph(df)
+    with phase("transform"):
+        graph = build_graph(df)
 
     if len(df) == 0 or graph.number_of_nodes() == 0:
-        fig = px.scatter(title='No Data')
-        fig.update_layout(annotations=[
-            dict(x=0.5, y=0.5, xref="paper", yref="paper", text="No data", showarrow=False, font=dict(size=20), )])
-        return fig, []
+        return message_figure("No data", "No Data")
+
+    progress(40, "Computing layout")
+    pos: dict = network_layout(graph, edge_list_hash(df), engine)
+    progress(80, "Plotting")
+    with phase("figure"):
+        return plot_network(graph, pos)
 
-    return plot_network(graph), get_centralises(graph).to_dict("records")
 
+def centralises_page(schema: str, industry: str, start_date: str, end_date: str, countries: str, sort_by: list[dict],
+                     page_current: int, page_size: int, engine: Engine) -> (list[dict], int):
+    df = build_edge_list(schema, industry, start_date, end_date, countries, engine)
+    with phase("transform"):
+        graph = build_graph(df)
+
+    if graph.number_of_nodes() == 0:
+        return [], 0
+
+    centralises: pd.DataFrame = network_centralises(graph, edge_list_hash(df), engine)
+    with phase("transform"):
+        return paginate_frame(centralises, sort_by, page_current, page_size)
+
+
+def plot_network(graph: nx.Graph, pos: [dict, None] = None, mode: str = NETWORK_RENDERING) -> go.Figure:
+    pos = pos if pos is not None else nx.spring_layout(graph, weight='weight', seed=LAYOUT_SEED)
+    return plot_network_webgl(graph, pos) if mode == "webgl" else plot_network_traces(graph, pos)
+
+
+def plot_network_webgl(graph: nx.Graph, pos: dict, buckets: int = EDGE_BUCKETS) -> go.Figure:
+    nodes: list[str] = list(graph.nodes)
+    xy: np.ndarray = np.array([pos[node] for node in nodes])
+    index: dict = {node: i for i, node in enumerate(nodes)}
+
+    edges: pd.DataFrame = nx.to_pandas_edgelist(graph)
+    source: np.ndarray = edges["source"].map(index).to_numpy()
+    target: np.ndarray = edges["target"].map(index).to_numpy()
+    weight: np.ndarray = edges["weight"].to_numpy(dtype=float)
+
+    span: float = weight.max() - weight.min()
+    weight_norm: np.ndarray = (weight - weight.min()) / span if span > 0 else np.zeros(len(weight))
+    bucket: np.ndarray = np.minimum((weight_norm * buckets).astype(int), buckets - 1)
+
+    # One WebGL trace per weight bucket, the edges are separated by gaps (NaN is serialised as null)
+    traces: list = []
+    for b in np.unique(bucket):
+        selected: np.ndarray = bucket == b
+        gap: np.ndarray = np.full(selected.sum(), np.nan)
+        traces.append(go.Scattergl(
+            x=np.column_stack([xy[source[selected], 0], xy[target[selected], 0], gap]).ravel(),
+            y=np.column_stack([xy[source[selected], 1], xy[target[selected], 1], gap]).ravel(),
+            mode="lines", hoverinfo="skip", line={"width": 1 + 4 * (b + 0.5) / buckets, "color": "rgba(0,0,0,.3)"}))
+
+    # The direction is marked close to the sanctioned country
+    head: np.ndarray = xy[source] + 0.85 * (xy[target] - xy[source])
+    traces.append(go.Scattergl(
+        x=head[:, 0], y=head[:, 1], mode="markers", hoverinfo="text",
+        text=edges["source"] + " → " + edges["target"] + ": " + edges["weight"].astype(str) + " entities",
+        marker={"size": 5 + 10 * weight_norm, "symbol": "diamond", "color": "rgba(0,0,0,.5)"}))
+
+    out: pd.DataFrame = edges.groupby("source")["weight"].agg(["sum", "count"]).reindex(nodes, fill_value=0)
+    traces.append(go.Scattergl(
+        x=xy[:, 0], y=xy[:, 1], mode="markers", hoverinfo="text", opacity=0.5,
+        text=out.index + " is sanctioning " + out["sum"].astype(str) + " entities (" + out["count"].astype(str) +
+             " Countries)",
+        marker={
+            "showscale": True, "colorscale": 'RdBu', "reversescale": True, "color": out["sum"].to_numpy(),
+            "size": 15, "colorbar": {"thickness": 10, "xanchor": 'left',
+                                     "title": {"text": 'Number of sanctioned entities', "side": 'right'}},
+            "line": {"width": 0}
+        }))
 
-def plot_network(graph: nx.Graph) -> go.Figure:
-    pos: dict = nx.spring_layout(graph, weight='weight')
+    ticks: dict = {"showgrid": True, "zeroline": True, "showticklabels": False}
 
+    return go.Figure(data=traces, layout=go.Layout(
+        title={"font": {"size": 16}}, showlegend=False, hovermode='closest',
+        margin={"b": 20, "l": 5, "r": 5, "t": 40}, xaxis=ticks, yaxis=ticks))
+
+
+def plot_network_traces(graph: nx.Graph, pos: dict) -> go.Figure:
     weights: list[float] = [d["weight"] for (_, _, d) in graph.edges(data=True)]
     min_weights: float = min(weights)
     max_weights: float = max(weights)
@@ -98,41 +224,36 @@ def plot_network(graph: nx.Graph) -> go.Figure:
     node_trace = go.Scatter(x=nodes_x, y=nodes_y, text=nodes_text, mode='markers', hoverinfo='text', opacity=0.5,
                             marker={
                                 "showscale": True, "colorscale": 'RdBu', "reversescale": True, "color": nodes_color,
-                                "size": 15, "colorbar": {"thickness": 10, "title": 'Number of sanctioned entities',
-                                                         "xanchor": 'left', "titleside": 'right'}, "line": {"width": 0}
+                                "size": 15, "colorbar": {"thickness": 10, "xanchor": 'left',
+                                                         "title": {"text": 'Number of sanctioned entities',
+                                                                   "side": 'right'}}, "line": {"width": 0}
                             })
 
     ticks: dict = {"showgrid": True, "zeroline": True, "showticklabels": False}
 
     fig: go.Figure = go.Figure(data=annotations + [node_trace], layout=go.Layout(
-                         titlefont={"size": 16}, showlegend=False, hovermode='closest',
+                         title={"font": {"size": 16}}, showlegend=False, hovermode='closest',
                          margin={"b": 20, "l": 5, "r": 5, "t": 40}, xaxis=ticks, yaxis=ticks))
     return fig
 
 
-def get_centralises(graph: nx.Graph) -> pd.DataFrame:
+def networkx_centralises(graph: nx.DiGraph, betweenness: bool = True) -> pd.DataFrame:
     metrics: dict = {
         "Degree": nx.degree_centrality(graph),
         "In-Degree": nx.in_degree_centrality(graph),
         "Out-Degree": nx.out_degree_centrality(graph),
         "Closeness": nx.closeness_centrality(graph),
-        "Betweenness": nx.betweenness_centrality(graph, weight="weight"),
+        "Betweenness": nx.betweenness_centrality(graph, weight="weight") if betweenness else None,
         "Clustering": nx.clustering(graph, weight="weight"),
         "Pagerank": nx.pagerank(graph, weight="weight")
     }
 
-    metric_names: list[str] = list(metrics.keys())
-    data: list[list[float]] = []
-
-    for country in sorted(graph.nodes, reverse=True):
-        row = [country]
+    if not betweenness:
+        del metrics["Betweenness"]
 
-        for metric in metric_names:
-            if country in metrics[metric]:
-                row.append(np.array(metrics[metric][country]).round(2))
-            else:
-                row.append(None)
+    return pd.DataFrame(metrics).rename_axis("Country").reset_index()
 
-        data.append(row)
 
-    return pd.DataFrame(data, columns=["Country"] + metric_names)
+def get_centralises(graph: nx.Graph, method: str = CENTRALITY_ENGINE) -> pd.DataFrame:
+    df: pd.DataFrame = sparse_centralises(graph) if method == "sparse" else networkx_centralises(graph)
+    return df.sort_values("Country", ascending=False).round(2).reset_index(drop=True)
@@ -1,20 +1,33 @@
+import os
+from datetime import date, timedelta
+
 import pandas as pd
 import plotly.express as px
 from sqlalchemy import Engine
 import plotly.graph_objs as go
 
+from tab_util.cache import read_sql
+from tab_util.metrics import phase
+from tab_util.util import load_page, dimension_condition
+
+COUNTRY_DATA_COLUMNS: list[str] = ["id", "caption", "first_seen", "schema", "industry", "target", "source"]
+
+# The timeline uses the finest resolution (of the rollups in sql/aggregates.sql) with at most TIMELINE_MAX_POINTS
+# points in the selected (or zoomed) date range. resolution -> maximum days per point
+TIMELINE_MAX_POINTS: int = int(os.environ.get("TIMELINE_MAX_POINTS", 400))
+RESOLUTIONS: dict[str, int] = {"day": 1, "week": 7, "month": 31}
 
-def generate_country_data(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str,
-                          engine: Engine) -> pd.DataFrame:
 
+def country_conditions(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str
+                       ) -> (list[str], dict):
     col: str = "target_country" if "Sanctions towards" == mode else "source_country"
-    conditions: list[str] = ["source_country != target_country", f"{col} = %(c)s"]
+    conditions: list[str] = ["source_country_id != target_country_id", dimension_condition(col, "c")]
 
     if schema is not None and schema.strip() != "":
-        conditions.append("schema = %(s)s")
+        conditions.append(dimension_condition("schema", "s"))
 
     if industry is not None and industry.strip() != "":
-        conditions.append("industry = %(i)s")
+        conditions.append(dimension_condition("industry", "i"))
 
     if start_date is not None and start_date.strip() != "":
         conditions.append("first_seen > %(sd)s")
@@ -22,6 +35,15 @@ def generate_country_data(mode: str, country: str, schema: str, industry: str, s
     if end_date is not None and end_date.strip() != "":
         conditions.append("first_seen < %(ed)s")
 
+    params: dict = {"c": country, "s": schema, "i": industry, "sd": start_date, "ed": end_date}
+
+    return conditions, params
+
+
+def country_data_query(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str
+                       ) -> (str, dict):
+    conditions, params = country_conditions(mode, country, schema, industry, start_date, end_date)
+
     sql: str = f"""SELECT 
         id, caption, first_seen, schema, industry, t.description AS target, s.description AS source
     FROM entities_countries 
@@ -29,35 +51,217 @@ def generate_country_data(mode: str, country: str, schema: str, industry: str, s
     JOIN countries s ON (s.alpha_2 = source_country)
     WHERE { ' AND '.join(conditions) }"""
 
-    params: dict = {"c": country, "s": schema, "i": industry, "sd": start_date, "ed": end_date}
+    return sql, params
+
+
+def generate_country_data(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str,
+                          engine: Engine) -> pd.DataFrame:
+    sql, params = country_data_query(mode, country, schema, industry, start_date, end_date)
+
+    return read_sql(sql, params, engine)
 
-    return pd.read_sql(sql, params=params, con=engine)
+
+def country_data_page(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str,
+                      sort_by: list[dict], page_current: int, page_size: int, state: dict, engine: Engine
+                      ) -> (list[dict], int, int, dict):
+    query: [tuple[str, dict], None] = None if mode is None or country is None else \
+        country_data_query(mode, country, schema, industry, start_date, end_date)
+
+    return load_page(query, COUNTRY_DATA_COLUMNS, ["id", "target", "source"], sort_by, page_current, page_size, state,
+                     engine)
+
+
+def country_aggregates_query(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str
+                             ) -> (str, dict):
+    conditions, params = country_conditions(mode, country, schema, industry, start_date, end_date)
+    col: str = "s" if mode == "Sanctions towards" else "t"
+
+    # Entities by country are counted distinct, the other charts count the (entity, country pair) rows.
+    # The timeline is loaded from the rollups (create_timeline)
+    sql: str = f"""SELECT 
+        CASE WHEN GROUPING({col}.description) = 0 THEN 'country' WHEN GROUPING(schema) = 0 THEN 'schema' 
+             ELSE 'industry' END AS dimension,
+        {col}.description AS country, schema, industry,
+        CASE WHEN GROUPING({col}.description) = 0 THEN count(DISTINCT id) ELSE count(id) END AS amount
+    FROM entities_countries 
+    JOIN countries t ON (t.alpha_2 = target_country) 
+    JOIN countries s ON (s.alpha_2 = source_country)
+    WHERE { ' AND '.join(conditions) }
+    GROUP BY GROUPING SETS (({col}.description), (schema), (industry))"""
+
+    return sql, params
+
+
+def generate_country_aggregates(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str,
+                                engine: Engine) -> pd.DataFrame:
+    sql, params = country_aggregates_query(mode, country, schema, industry, start_date, end_date)
+    return read_sql(sql, params, engine)
 
 
 def create_graphs(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str, engine: Engine
-                  ) -> (go.Figure, go.Figure, go.Figure, go.Figure, dict):
+                  ) -> (go.Figure, go.Figure, go.Figure):
 
     if mode is None or country is None:
         plt1 = px.bar(pd.DataFrame({"Country": [], "Amount": []}), x="Country", y="Amount")
-        plt2 = px.bar(pd.DataFrame({"Date": [], "Amount": []}), x="Date", y="Amount")
         plt3 = px.bar(pd.DataFrame({"Schema": [], "Amount": []}), x="Schema", y="Amount")
         plt4 = px.bar(pd.DataFrame({"Industry": [], "Amount": []}), x="Industry", y="Amount")
 
-        return plt1, plt2, plt3, plt4, []
+        return plt1, plt3, plt4
 
-    df: pd.DataFrame = generate_country_data(mode, country, schema, industry, start_date, end_date, engine)
+    df: pd.DataFrame = generate_country_aggregates(mode, country, schema, industry, start_date, end_date, engine)
+
+    def dimension(name: str, key: str) -> pd.DataFrame:
+        return df.loc[(df["dimension"] == name) & df[key].notna(), [key, "amount"]]
 
     col: str = "source" if mode == "Sanctions towards" else "target"
-    df1: pd.DataFrame = df.groupby(col)["id"].nunique().reset_index().sort_values(by="id")
-    plt1: go.Figure = px.bar(df1, x=col, y="id", labels={"id": "Amount", col: "Country"})
 
-    df2: pd.DataFrame = df.groupby("first_seen")["id"].count().sort_index().reset_index()\
-        .rename(columns={"first_seen": "First Seen", "id": "# Entries"})
+    with phase("transform"):
+        df1: pd.DataFrame = dimension("country", "country").rename(columns={"country": col, "amount": "id"})\
+            .sort_values(by="id")
+
+        schemas: pd.Series = dimension("schema", "schema").set_index("schema")["amount"].rename("count")\
+            .sort_values()
+
+        industries: pd.Series = dimension("industry", "industry").set_index("industry")["amount"].rename("count")\
+            .sort_values()
+
+    with phase("figure"):
+        plt1: go.Figure = px.bar(df1, x=col, y="id", labels={"id": "Amount", col: "Country"})
+        plt3: go.Figure = px.bar(schemas, labels={"value": "Count", "schema": "Schema"})
+        plt4: go.Figure = px.bar(industries, labels={"value": "Count", "schema": "Schema"})
+
+    return plt1, plt3, plt4
+
+
+def zoomed_range(relayout: [dict, None]) -> [tuple[str, str], None]:
+    # x axis range of a zoom (relayoutData of the timeline), None for other events (e.g. autosize or autorange)
+    if relayout is None:
+        return None
+
+    if "xaxis.range[0]" in relayout and "xaxis.range[1]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+
+    return tuple(relayout["xaxis.range"]) if "xaxis.range" in relayout else None
+
+
+def timeline_range(start_date: str, end_date: str, zoom: [tuple[str, str], None]
+                   ) -> ([date, None], bool, [date, None]):
+    # First day, whether the entries at midnight of the first day are excluded (as by "first_seen > start_date")
+    # and the first day after the range
+    start: [date, None] = date.fromisoformat(start_date[:10]) if start_date else None
+    end: [date, None] = date.fromisoformat(end_date[:10]) if end_date else None
+    exclusive: bool = start is not None
+
+    # A zoom narrows the filtered range to the (partially) visible days
+    if zoom is not None:
+        zoom_start, zoom_end = date.fromisoformat(zoom[0][:10]), date.fromisoformat(zoom[1][:10]) + timedelta(days=1)
+
+        if start is None or zoom_start > start:
+            start, exclusive = zoom_start, False
+
+        if end is None or zoom_end < end:
+            end = zoom_end
+
+    return start, exclusive, end
+
+
+def timeline_resolution(start: [date, None], end: [date, None], extent: tuple[date, date]) -> str:
+    days: int = ((end or extent[1]) - (start or extent[0])).days
+
+    for resolution, length in RESOLUTIONS.items():
+        if days / length <= TIMELINE_MAX_POINTS:
+            return resolution
+
+    return "month"
+
+
+def timeline_query(mode: str, country: str, schema: str, industry: str, resolution: str, start: [date, None],
+                   exclusive: bool, end: [date, None]) -> (str, dict):
+    conditions: list[str] = ["country = %(c)s", "direction = %(d)s"]
+
+    if schema is not None and schema.strip() != "":
+        conditions.append("schema = %(s)s")
+
+    if industry is not None and industry.strip() != "":
+        conditions.append("industry = %(i)s")
+
+    params: dict = {"c": country, "d": "towards" if "Sanctions towards" == mode else "from", "s": schema, "i": industry,
+                    "r": resolution,
+                    "ts": start.isoformat() if start else None, "te": end.isoformat() if end else None}
+
+    # Days in the range
+    days: list[str] = []
+    if start is not None:
+        days.append("(period > %(ts)s OR (period = %(ts)s AND NOT at_midnight))" if exclusive else "period >= %(ts)s")
+    if end is not None:
+        days.append("period < %(te)s")
+
+    if resolution == "day":
+        return f"""SELECT period, sum(entries)::bigint AS entries 
+        FROM timeline_rollup 
+        WHERE resolution = 'day' AND {' AND '.join(conditions + days)}
+        GROUP BY 1 
+        ORDER BY 1""", params
+
+    # Weeks/ months that lie completely in the range come from their rollup, the partially covered ones at the
+    # start and the end of the range are summed up from the days
+    def complete(period: str) -> list[str]:
+        return ([f"{period} {'>' if exclusive else '>='} %(ts)s"] if start is not None else []) + \
+            ([f"{period} + INTERVAL '1 {resolution}' <= %(te)s"] if end is not None else [])
+
+    bucket: str = f"date_trunc('{resolution}', period::timestamp)::date"
+    edges: str = "" if start is None and end is None else f"""
+            UNION ALL
+            SELECT {bucket} AS period, entries 
+            FROM timeline_rollup 
+            WHERE resolution = 'day' AND {' AND '.join(conditions + days)} 
+                AND NOT ({' AND '.join(complete(bucket))})"""
+
+    return f"""SELECT period, sum(entries)::bigint AS entries 
+        FROM (
+            SELECT period, entries 
+            FROM timeline_rollup 
+            WHERE resolution = %(r)s AND {' AND '.join(conditions + complete("period"))}{edges}
+        ) r
+        GROUP BY 1 
+        ORDER BY 1""", params
+
+
+def timeline_extent(mode: str, country: str, schema: str, industry: str, engine: Engine) -> [tuple[date, date], None]:
+    # First and last month with entries (only needed for an open date range)
+    sql, params = timeline_query(mode, country, schema, industry, "month", None, False, None)
+    df: pd.DataFrame = read_sql(f"SELECT min(period) AS first, max(period) AS last FROM ({sql}) t", params, engine)
+
+    if df["first"].isna().all():
+        return None
+
+    return pd.Timestamp(df["first"][0]).date(), pd.Timestamp(df["last"][0]).date() + timedelta(days=31)
+
+
+def create_timeline(mode: str, country: str, schema: str, industry: str, start_date: str, end_date: str,
+                    relayout: [dict, None], engine: Engine) -> go.Figure:
+    labels: dict = {"period": "First Seen", "entries": "# Entries"}
+
+    if mode is None or country is None:
+        return px.line(pd.DataFrame({"period": [], "entries": []}), x="period", y="entries", labels=labels)
+
+    zoom: [tuple[str, str], None] = zoomed_range(relayout)
+    start, exclusive, end = timeline_range(start_date, end_date, zoom)
+    extent: [tuple[date, date], None] = (start, end) if start is not None and end is not None else \
+        timeline_extent(mode, country, schema, industry, engine)
 
-    plt2: go.Figure = px.line(df2, x="First Seen", y="# Entries")
+    resolution: str = timeline_resolution(start, end, extent) if extent is not None else "month"
+    df: pd.DataFrame = read_sql(*timeline_query(mode, country, schema, industry, resolution, start, exclusive, end),
+                                engine)
 
-    plt3: go.Figure = px.bar(df["schema"].value_counts().sort_values(), labels={"value": "Count", "schema": "Schema"})
+    with phase("figure"):
+        labels["period"] = f"First Seen (per {resolution})"
+        fig: go.Figure = px.line(df, x="period", y="entries", labels=labels, markers=len(df) <= 60)
 
-    plt4: go.Figure = px.bar(df["industry"].value_counts().sort_values(), labels={"value": "Count", "schema": "Schema"})
+        # The zoom (only of the x axis) is kept while the details are loaded, new filters reset it (uirevision)
+        fig.update_yaxes(fixedrange=True)
+        fig.update_layout(uirevision=str([mode, country, schema, industry, start_date, end_date]))
+        if zoom is not None:
+            fig.update_xaxes(range=list(zoom))
 
-    return plt1, plt2, plt3, plt4, df.to_dict("records")
+    return fig
@@ -0,0 +1,128 @@
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine
+
+from tab_util.snapshot import run_query
+
+
+def trigrams(text: str) -> set[str]:
+    grams: set[str] = set()
+
+    # like pg_trgm: words are runs of alphanumerics, padded with two blanks in front and one behind
+    for word in re.findall(r"[^\W_]+", text):
+        padded: str = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    return grams
+
+
+class EntitySearchIndex:
+    def __init__(self, ids: list[str], names: list[str], schemas: list[str], threshold: float = 0.3):
+        self.ids: np.ndarray = np.array(ids, dtype=object)
+        self.names: np.ndarray = np.array([name.lower() for name in names], dtype=object)
+        self.schemas: np.ndarray = np.array(schemas, dtype=object)
+        self.threshold: float = threshold
+        self.name_array = None  # pyarrow array of the names, built by the first substring scan
+
+        # The entity of every name (an entity has several names, the best one ranks it)
+        self.entities: np.ndarray = pd.factorize(self.ids)[0]
+
+        self.sorted_rows: np.ndarray = np.argsort(self.names, kind="stable")
+        self.sorted_names: list[str] = self.names[self.sorted_rows].tolist()
+
+        postings: defaultdict = defaultdict(list)
+        self.gram_counts: np.ndarray = np.zeros(len(self.names), dtype=np.int32)
+        for i, name in enumerate(self.names):
+            grams: set[str] = trigrams(name)
+            self.gram_counts[i] = len(grams)
+
+            for gram in grams:
+                postings[gram].append(i)
+
+        self.postings: dict[str, np.ndarray] = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    @classmethod
+    def load(cls, engine: Engine) -> "EntitySearchIndex":
+        df: pd.DataFrame = run_query("SELECT id, name, schema FROM entity_names JOIN entities USING (id)", None, engine)
+        return cls(df["id"].tolist(), df["name"].tolist(), df["schema"].tolist())
+
+    def prefix_rows(self, query: str) -> np.ndarray:
+        start: int = bisect.bisect_left(self.sorted_names, query)
+        end: int = bisect.bisect_left(self.sorted_names, query + "￿")
+        return self.sorted_rows[start:end]
+
+    def substring_rows(self, query: str) -> np.ndarray:
+        # Arrow kernel over the names (np.char would need a fixed width copy of all names)
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if self.name_array is None:
+            self.name_array = pa.array(self.names, type=pa.string())
+
+        return np.flatnonzero(pc.match_substring(self.name_array, query).to_numpy(zero_copy_only=False))
+
+    def shared_grams(self, grams: set[str]) -> np.ndarray:
+        # The number of the grams every name contains
+        postings: list[np.ndarray] = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return np.zeros(len(self.names), dtype=np.int64)
+
+        return np.bincount(np.concatenate(postings), minlength=len(self.names))
+
+    def similarity(self, shared: np.ndarray, rows: np.ndarray, query_grams: int) -> np.ndarray:
+        # shared / (query grams + name grams - shared), like pg_trgm
+        return shared[rows] / np.maximum(query_grams + self.gram_counts[rows] - shared[rows], 1)
+
+    def search(self, query: str, limit: int = 1000, schema: [str, None] = None) -> (list[str], list[float]):
+        query = query.lower().strip()
+        query_grams: set[str] = trigrams(query)
+
+        # Fuzzy candidates share at least one trigram with the query
+        shared: np.ndarray = self.shared_grams(query_grams)
+        candidates: np.ndarray = np.flatnonzero(shared)
+
+        # A name containing the query contains its trigrams within the words (without the padding). A query without
+        # such trigrams (words of one or two characters) can sit anywhere inside a word: all names are scanned
+        inner: set[str] = {gram for gram in query_grams if " " not in gram}
+        if inner:
+            contains: np.ndarray = candidates[self.shared_grams(inner)[candidates] == len(inner)]
+        else:
+            contains: np.ndarray = self.substring_rows(query)
+
+        similar: np.ndarray = candidates[self.similarity(shared, candidates, len(query_grams)) >= self.threshold]
+        selected: np.ndarray = np.zeros(len(self.names), dtype=bool)
+        for matches in (similar, contains, self.prefix_rows(query)):
+            selected[matches] = True
+
+        rows: np.ndarray = np.flatnonzero(selected)
+        if schema is not None:
+            rows = rows[self.schemas[rows] == schema]
+
+        similarity: np.ndarray = self.similarity(shared, rows, len(query_grams))
+
+        # exact name > prefix > substring > trigram similarity (like RANK in entity_search.py)
+        names: np.ndarray = self.names[rows].astype(str)
+        prefix: np.ndarray = np.char.startswith(names, query)
+        substring: np.ndarray = np.char.find(names, query) >= 0
+        scores: np.ndarray = np.where(names == query, 3.0, similarity + np.where(prefix, 2, substring.astype(int)))
+
+        keep: np.ndarray = substring | (similarity >= self.threshold)
+        rows, scores = rows[keep], scores[keep]
+
+        # The best name of every entity, then the top entities
+        order: np.ndarray = np.lexsort((-scores, self.entities[rows]))
+        entities: np.ndarray = self.entities[rows[order]]
+        first: np.ndarray = np.ones(len(entities), dtype=bool)
+        first[1:] = entities[1:] != entities[:-1]
+        rows, scores = rows[order][first], scores[order][first]
+
+        if len(rows) > limit:
+            top: np.ndarray = np.argpartition(-scores, limit - 1)[:limit]
+            rows, scores = rows[top], scores[top]
+
+        order = np.argsort(-scores, kind="stable")
+        return self.ids[rows[order]].tolist(), scores[order].tolist()
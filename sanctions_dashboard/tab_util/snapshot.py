@@ -0,0 +1,95 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterator
+
+import pandas as pd
+from sqlalchemy import Engine
+
+from tab_util.metrics import phase, observe_query
+
+# QUERY_BACKEND=postgres|duckdb, duckdb runs the tab queries in process on the Parquet snapshot in SNAPSHOT_DIR
+# (written by util/ExportSnapshot.py), SNAPSHOT_THREADS=<threads of the DuckDB executor>
+QUERY_BACKEND: str = os.environ.get("QUERY_BACKEND", "postgres")
+SNAPSHOT_DIR: str = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                                                "..", "data", "snapshot"))
+SNAPSHOT_THREADS: [int, None] = int(os.environ["SNAPSHOT_THREADS"]) if "SNAPSHOT_THREADS" in os.environ else None
+
+PARAMETER: re.Pattern = re.compile(r"%\((\w+)\)s")
+
+
+def translate(sql: str, params: [dict, None]) -> (str, dict):
+    # psycopg2 placeholders -> DuckDB named parameters, DuckDB rejects parameters the statement does not use
+    used: dict = {name: (params or {})[name] for name in PARAMETER.findall(sql)}
+    return PARAMETER.sub(r"$\1", sql).replace("%%", "%"), used
+
+
+# Read only "engine" of a Parquet snapshot: every table is a view on its Parquet file, the files are scanned
+# (in parallel, only the used columns and row groups) by DuckDB without a database round trip
+class SnapshotEngine:
+    def __init__(self, directory: str = SNAPSHOT_DIR, threads: [int, None] = SNAPSHOT_THREADS):
+        self.directory: str = directory
+        self.threads: [int, None] = threads
+        self.path: [str, None] = None
+        self.connection = None
+        self.lock: threading.Lock = threading.Lock()
+
+    def open(self, path: str):
+        import duckdb
+
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest: dict = json.load(f)
+
+        connection = duckdb.connect(":memory:", config={"threads": self.threads} if self.threads else {})
+        for table in manifest["tables"]:
+            connection.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{os.path.join(path, table)}.parquet')")
+
+        connection.execute(f"CREATE VIEW snapshot AS SELECT {int(manifest['version'])} AS version, "
+                           f"TIMESTAMP '{manifest['created']}' AS updated_at")
+        return connection
+
+    def cursor(self):
+        # A newly published snapshot is picked up with the next query
+        path: str = os.path.realpath(os.path.join(self.directory, "current"))
+
+        with self.lock:
+            if self.connection is None or path != self.path:
+                self.connection, self.path = self.open(path), path
+
+            # Cursors are separate connections to the same database, one per query (thread safe)
+            return self.connection.cursor()
+
+    def read_sql(self, sql: str, params: [dict, None] = None) -> pd.DataFrame:
+        sql, params = translate(sql, params)
+        with self.cursor() as cursor:
+            # dates as datetime.date like psycopg2
+            return cursor.execute(sql, params).df(date_as_object=True)
+
+    def stream(self, sql: str, params: [dict, None], chunk_size: int) -> Iterator[pd.DataFrame]:
+        sql, params = translate(sql, params)
+        with self.cursor() as cursor:
+            for batch in cursor.execute(sql, params).fetch_record_batch(chunk_size):
+                yield batch.to_pandas()
+
+    def dispose(self, close: bool = True) -> None:
+        # DuckDB connections are not shared with forked processes, the child opens its own
+        with self.lock:
+            if close and self.connection is not None:
+                self.connection.close()
+            self.connection, self.path = None, None
+
+
+def run_query(sql: str, params: [dict, None], engine: [Engine, SnapshotEngine]) -> pd.DataFrame:
+    started: float = time.perf_counter()
+
+    with phase("query"):
+        if isinstance(engine, SnapshotEngine):
+            df: pd.DataFrame = engine.read_sql(sql, params)
+        else:
+            df: pd.DataFrame = pd.read_sql(sql, params=params, con=engine)
+
+    observe_query(sql, params, "duckdb" if isinstance(engine, SnapshotEngine) else "postgres",
+                  time.perf_counter() - started, len(df))
+    return df
@@ -1,28 +1,115 @@
+import json
+import math
+
 import pandas as pd
 from sqlalchemy import Engine
 
+from tab_util.cache import read_sql
+from tab_util.metrics import phase
+
+
+# Dictionary encoded columns of entities_countries (sql/schema.sql) -> dictionary
+DIMENSIONS: dict[str, str] = {"target_country": "dim_countries", "source_country": "dim_countries",
+                              "schema": "dim_schemas", "industry": "dim_industries"}
+
+
+def dimension_condition(column: str, param: str) -> str:
+    # The key is compared, the value is looked up once (partitions of other source countries are pruned at runtime)
+    return f"{column}_id = (SELECT id FROM {DIMENSIONS[column]} WHERE value = %({param})s)"
+
+
+def filter_options(kind: str, engine: Engine) -> list[dict]:
+    # Precomputed by sql/aggregates.sql, cached until the next snapshot
+    options: pd.DataFrame = read_sql("SELECT value, label FROM filter_options WHERE kind = %(k)s ORDER BY label",
+                                     {"k": kind}, engine)
+
+    return [{"label": row[1], "value": row[0]} for row in options.values]
+
+
+def json_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+
+    return value.item() if hasattr(value, "item") else value
+
+
+def order_columns(sort_by: list[dict], columns: list[str], tiebreak: list[str]) -> list[tuple[str, bool]]:
+    order: list[tuple[str, bool]] = [(s["column_id"], s["direction"] == "desc") for s in sort_by or []
+                                     if s["column_id"] in columns]
+
+    return order + [(col, False) for col in tiebreak if col not in dict(order)]
+
+
+def keyset_condition(order: list[tuple[str, bool]], key: list) -> (str, dict):
+    # Rows strictly after the key in "ORDER BY col ASC NULLS LAST / DESC NULLS FIRST" order
+    terms: list[str] = []
+    params: dict = {f"_k{i}": value for i, value in enumerate(key)}
+
+    for i, (col, desc) in enumerate(order):
+        equal: list[str] = [f'r."{c}" IS NULL' if key[j] is None else f'r."{c}" = %(_k{j})s'
+                            for j, (c, _) in enumerate(order[:i])]
+
+        if key[i] is None:
+            after: [str, None] = f'r."{col}" IS NOT NULL' if desc else None
+        else:
+            after: [str, None] = f'r."{col}" < %(_k{i})s' if desc else f'(r."{col}" > %(_k{i})s OR r."{col}" IS NULL)'
+
+        if after is not None:
+            terms.append("(" + " AND ".join(equal + [after]) + ")")
+
+    return " OR ".join(terms) or "FALSE", params
+
+
+def count_rows(sql: str, params: dict, engine: Engine) -> int:
+    return int(read_sql(f"SELECT count(*) AS count FROM ({sql}) r", params, engine)["count"][0])
+
+
+def fetch_page(sql: str, params: dict, order: list[tuple[str, bool]], page_size: int, offset: int, key: [list, None],
+               engine: Engine) -> pd.DataFrame:
+    condition, key_params = ("TRUE", {}) if key is None else keyset_condition(order, key)
+    order_by: str = ", ".join(f'r."{col}" {"DESC NULLS FIRST" if desc else "ASC NULLS LAST"}' for col, desc in order)
+
+    sql = f"SELECT * FROM ({sql}) r WHERE {condition} ORDER BY {order_by} LIMIT %(_limit)s OFFSET %(_offset)s"
+    params = {**params, **key_params, "_limit": page_size, "_offset": 0 if key is not None else offset}
+
+    return read_sql(sql, params, engine)
+
+
+def load_page(query: [tuple[str, dict], None], columns: list[str], tiebreak: list[str], sort_by: list[dict],
+              page_current: int, page_size: int, state: [dict, None], engine: Engine) -> (list[dict], int, int, dict):
+    if query is None:
+        return [], 0, 0, None
+
+    sql, params = query
+    order: list[tuple[str, bool]] = order_columns(sort_by, columns, tiebreak)
+    signature: str = json.dumps([sql, params, order, page_size], default=str)
+
+    # New filters, sorting or page size invalidate the stored page keys (and the filters the total count)
+    if state is None or state["signature"] != signature:
+        filters: str = json.dumps([sql, params], default=str)
+        total: int = state["total"] if state is not None and state["filters"] == filters else \
+            count_rows(sql, params, engine)
+        state, page_current = {"signature": signature, "filters": filters, "total": total, "keys": {}}, 0
+
+    # Continue after the last row of the previous page if it is known (otherwise the page was jumped to)
+    key: [list, None] = state["keys"].get(str(page_current - 1))
+    df: pd.DataFrame = fetch_page(sql, params, order, page_size, page_current * page_size, key, engine)
 
-def df_to_excel(df: pd.DataFrame, sheet_name: str) -> callable:
-    def to_xlsx(bytes_io):
-        xslx_writer: pd.ExcelWriter = pd.ExcelWriter(bytes_io, engine="xlsxwriter")
-        pd.DataFrame(df).to_excel(xslx_writer, index=False, sheet_name=sheet_name)
-        xslx_writer.sheets[sheet_name].autofit()
-        xslx_writer.close()
+    with phase("transform"):
+        if len(df) > 0:
+            state["keys"][str(page_current)] = [json_value(df[col].iloc[-1]) for col, _ in order]
 
-    return to_xlsx
+        return df.to_dict("records"), page_current, math.ceil(state["total"] / page_size), state
 
 
-def create_country_list(engine: Engine, col: [None, str] = None) -> list[dict]:
-    if col is not None:
-        sql: str = f"SELECT DISTINCT {col}, description FROM entities_countries JOIN countries ON ({col} = alpha_2)"
-    else:
-        sql: str = """SELECT alpha_2, description FROM (
-                        SELECT source_country AS alpha_2 FROM entities_countries
-                        UNION
-                        SELECT target_country AS alpha_2 FROM entities_countries
-                    ) a
-                    JOIN countries USING (alpha_2)"""
+def paginate_frame(df: pd.DataFrame, sort_by: list[dict], page_current: int, page_size: int) -> (list[dict], int):
+    if len(sort_by or []) > 0:
+        df = df.sort_values(by=[s["column_id"] for s in sort_by],
+                            ascending=[s["direction"] == "asc" for s in sort_by], na_position="last")
 
-    country_list: pd.DataFrame = pd.read_sql(sql, con=engine)
+    page: pd.DataFrame = df.iloc[page_current * page_size:(page_current + 1) * page_size]
 
-    return [{"label": row[1], "value": row[0]} for row in country_list.values]
+    return page.to_dict("records"), math.ceil(len(df) / page_size)
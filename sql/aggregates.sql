@@ -0,0 +1,85 @@
+/* Aggregates of the staging table entities_countries_data_new. util/BuildEntitiesCountries.py builds them before the
+   swap, which replaces the current relations by the *_new ones, so the dashboard keeps querying the current
+   aggregates in the meantime */
+
+/* Country -sanctions-> Country cube for the network analysis.
+   Schema, industry and first_seen are attributes of the entity, so every entity falls into exactly one cell per
+   country pair and summing the cells yields the distinct number of entities. The rollups group the dictionary keys
+   and decode the (fewer) groups. Like timeline_rollup a table, which the delta updates add the changes to */
+DROP TABLE IF EXISTS network_cube_new;
+CREATE TABLE network_cube_new AS
+SELECT sc.value AS source_country, tc.value AS target_country, s.value AS schema, i.value AS industry, first_seen,
+       at_midnight, entities
+FROM (
+    SELECT source_country_id, target_country_id, schema_id, industry_id, first_seen::date AS first_seen,
+           first_seen = first_seen::date AS at_midnight, count(DISTINCT id) AS entities
+    FROM entities_countries_data_new
+    WHERE source_country_id != target_country_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+) c
+JOIN dim_countries sc ON (sc.id = c.source_country_id)
+JOIN dim_countries tc ON (tc.id = c.target_country_id)
+LEFT JOIN dim_schemas s ON (s.id = c.schema_id)
+LEFT JOIN dim_industries i ON (i.id = c.industry_id);
+
+CREATE UNIQUE INDEX network_cube_new_cell ON network_cube_new
+    (source_country, target_country, schema, industry, first_seen, at_midnight) NULLS NOT DISTINCT;
+CREATE INDEX network_cube_new_first_seen ON network_cube_new (first_seen);
+CREATE INDEX network_cube_new_empty ON network_cube_new (entities) WHERE entities = 0;
+ANALYZE network_cube_new;
+
+/* Daily, weekly and monthly counts of the (entity, country pair) rows for the timeline of the Sanctions by Country
+   tab, per country and direction ('towards': sanctions towards the country, 'from': sanctions from the country).
+   at_midnight marks the daily rows of entries seen at 00:00, which the "first_seen > <day>" filter excludes.
+   The weeks start on Monday. A table instead of a materialized view, so the delta updates add the changes of the
+   affected entities (sql/update_aggregates.sql) */
+DROP TABLE IF EXISTS timeline_rollup_new;
+CREATE TABLE timeline_rollup_new AS
+SELECT resolution, period, at_midnight, c.value AS country, direction, s.value AS schema, i.value AS industry, entries
+FROM (
+    SELECT resolution, period, resolution = 'day' AND first_seen = first_seen::date AS at_midnight, country_id,
+           direction, schema_id, industry_id, count(*) AS entries
+    FROM entities_countries_data_new,
+         LATERAL (VALUES ('day', first_seen::date), ('week', date_trunc('week', first_seen)::date),
+                         ('month', date_trunc('month', first_seen)::date)) r (resolution, period),
+         LATERAL (VALUES (target_country_id, 'towards'), (source_country_id, 'from')) d (country_id, direction)
+    WHERE source_country_id != target_country_id AND first_seen IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6, 7
+) r
+JOIN dim_countries c ON (c.id = r.country_id)
+LEFT JOIN dim_schemas s ON (s.id = r.schema_id)
+LEFT JOIN dim_industries i ON (i.id = r.industry_id);
+
+CREATE UNIQUE INDEX timeline_rollup_new_cell ON timeline_rollup_new
+    (country, direction, resolution, period, at_midnight, schema, industry) NULLS NOT DISTINCT;
+CREATE INDEX timeline_rollup_new_empty ON timeline_rollup_new (entries) WHERE entries = 0;
+ANALYZE timeline_rollup_new;
+
+/* Options of the dashboard filters (countries, schemas and industries), so the dashboard does not have to scan
+   entities_countries and entities when it starts. A delta import only adds new options (sql/update_aggregates.sql),
+   options without entries anymore are removed by the next full build */
+DROP TABLE IF EXISTS filter_options_new;
+CREATE TABLE filter_options_new (LIKE filter_options);
+
+INSERT INTO filter_options_new (kind, value, label)
+WITH pairs AS (
+    SELECT sc.value AS source_country, tc.value AS target_country
+    FROM (SELECT DISTINCT source_country_id, target_country_id FROM entities_countries_data_new) p
+    JOIN dim_countries sc ON (sc.id = p.source_country_id)
+    JOIN dim_countries tc ON (tc.id = p.target_country_id)
+)
+SELECT kind, alpha_2, description
+FROM (
+    SELECT 'source_country' AS kind, source_country AS alpha_2 FROM pairs
+    UNION SELECT 'target_country', target_country FROM pairs
+    UNION SELECT 'country', source_country FROM pairs
+    UNION SELECT 'country', target_country FROM pairs
+) c
+JOIN (SELECT DISTINCT ON (alpha_2) alpha_2, description FROM countries ORDER BY alpha_2, description) d
+    USING (alpha_2);
+
+INSERT INTO filter_options_new (kind, value, label)
+SELECT DISTINCT 'schema', schema, schema FROM entities WHERE deleted_at IS NULL AND schema IS NOT NULL;
+
+INSERT INTO filter_options_new (kind, value, label)
+SELECT DISTINCT 'industry', industry, industry FROM companies WHERE industry IS NOT NULL;
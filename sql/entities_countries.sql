@@ -0,0 +1,15 @@
+/* Decoded entities_countries_data (sql/schema.sql). The dictionaries are joined on their primary keys, so the joins
+   of unused columns are removed by the planner. Filters should compare the keys (e.g. source_country_id = (SELECT id
+   FROM dim_countries WHERE value = 'us')), a filter on the decoded source_country can not prune the partitions.
+   last_seen, last_change and target (columns of the former table) are joined from entities, which is removed as
+   well when they are not selected */
+CREATE OR REPLACE VIEW entities_countries AS
+SELECT d.id, d.caption, tc.value AS target_country, sc.value AS source_country, s.value AS schema, d.first_seen,
+       i.value AS industry, d.target_country_id, d.source_country_id, d.schema_id, d.industry_id, e.last_seen,
+       e.last_change, e.target
+FROM entities_countries_data d
+LEFT JOIN dim_countries tc ON (tc.id = d.target_country_id)
+LEFT JOIN dim_countries sc ON (sc.id = d.source_country_id)
+LEFT JOIN dim_schemas s ON (s.id = d.schema_id)
+LEFT JOIN dim_industries i ON (i.id = d.industry_id)
+LEFT JOIN entities e ON (e.id = d.id);
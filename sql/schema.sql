@@ -1,16 +1,18 @@
-    DROP TABLE IF EXISTS entities;
+    DROP TABLE IF EXISTS entities CASCADE;
     CREATE TABLE entities (
         id TEXT PRIMARY KEY,
         caption TEXT,
         schema TEXT,
-        properties JSON,
-        referents JSON,
-        datasets JSON,
+        properties JSONB,
+        referents JSONB,
+        datasets JSONB,
         first_seen timestamp,
         last_seen timestamp,
         last_change timestamp,
         target boolean,
-        industry text
+        industry text,
+        industry_confidence real,
+        deleted_at timestamp
     );
 
     DROP TABLE IF EXISTS datasets;
@@ -21,24 +23,49 @@
         index_url TEXT,
         summary TEXT,
         description TEXT,
-        publisher JSON,
+        publisher JSONB,
         type TEXT
     );
 
-    DROP TABLE IF EXISTS entities_countries;
-    CREATE TABLE entities_countries (
-        id VARCHAR(255),
-        caption TEXT,
-        target_country varchar(8),
-        source_country varchar(8),
-        schema varchar(16),
-        first_seen timestamp,
-        last_seen timestamp,
-        last_change timestamp,
-        target boolean,
-        industry text
+    DROP TABLE IF EXISTS entity_datasets;
+    CREATE TABLE entity_datasets (
+        entity_id TEXT,
+        dataset_name TEXT,
+        title TEXT,
+        flag VARCHAR(3),
+        source_country varchar(8)
+    );
+
+    /* Dictionaries of the dimension columns of entities_countries_data (small integer keys instead of text) */
+    DROP TABLE IF EXISTS entities_countries_data CASCADE;
+    DROP TABLE IF EXISTS entities_countries CASCADE;
+    DROP TABLE IF EXISTS dim_countries, dim_schemas, dim_industries;
+    CREATE TABLE dim_countries (
+        id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        value VARCHAR(8) UNIQUE NOT NULL
+    );
+    CREATE TABLE dim_schemas (
+        id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE dim_industries (
+        id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
     );
 
+    /* Country -sanctions-> Country rows of the entities, dictionary encoded (the fixed width columns first, so they
+       are not padded). The dashboard reads the decoded view entities_countries (sql/entities_countries.sql) */
+    CREATE TABLE entities_countries_data (
+        first_seen timestamp,
+        target_country_id SMALLINT,
+        source_country_id SMALLINT,
+        schema_id SMALLINT,
+        industry_id SMALLINT,
+        id VARCHAR(255),
+        caption TEXT
+    ) PARTITION BY LIST (source_country_id);
+    CREATE TABLE entities_countries_data_default PARTITION OF entities_countries_data DEFAULT;
+
     DROP TABLE IF EXISTS countries;
     CREATE TABLE countries (
         alpha_2 VARCHAR(2),
@@ -61,4 +88,33 @@
         linkedin_url TEXT,
         current_employee_estimate INTEGER,
         total_employee_estimate	INTEGER
-    );
\ No newline at end of file
+    );
+
+    DROP TABLE IF EXISTS company_names;
+    CREATE TABLE company_names (
+        name_key TEXT PRIMARY KEY,
+        industry TEXT,
+        companies INTEGER
+    );
+
+    /* Progress of write_entities / write_entities_parallel, committed together with every batch */
+    DROP TABLE IF EXISTS load_checkpoints;
+    CREATE TABLE load_checkpoints (
+        input_file TEXT PRIMARY KEY,
+        byte_offset BIGINT,
+        line BIGINT
+    );
+
+    DROP TABLE IF EXISTS snapshot;
+    CREATE TABLE snapshot (
+        version INTEGER,
+        updated_at timestamp
+    );
+    INSERT INTO snapshot VALUES (0, now());
+
+    DROP TABLE IF EXISTS filter_options;
+    CREATE TABLE filter_options (
+        kind VARCHAR(16),
+        value TEXT,
+        label TEXT
+    );
@@ -0,0 +1,20 @@
+/* Searchable names (caption and name aliases) of the entities */
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DROP TABLE IF EXISTS entity_names;
+CREATE TABLE entity_names AS
+SELECT DISTINCT e.id, n.name
+FROM entities e
+CROSS JOIN LATERAL (
+    SELECT e.caption
+    UNION
+    SELECT jsonb_array_elements_text(e.properties->k) FROM unnest(ARRAY['name', 'alias', 'weakAlias', 'previousName']) k
+) n(name)
+WHERE e.deleted_at IS NULL AND n.name IS NOT NULL;
+
+CREATE INDEX ON entity_names (id);
+CREATE INDEX ON entity_names USING gin (lower(name) gin_trgm_ops);
+ANALYZE entity_names;
+
+/* new snapshot version (invalidates the query cache of the dashboard) */
+UPDATE snapshot SET version = version + 1, updated_at = now();
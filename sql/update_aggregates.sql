@@ -0,0 +1,74 @@
+/* Add the changes of the affected entities (entities_countries_delta, sql/update_entities_countries.sql) to the
+   aggregates instead of recomputing them, so a delta import does not scan entities_countries. The cells are matched
+   by their unique indexes (NULLS NOT DISTINCT, schema and industry may be NULL), cells that drop to zero entries
+   are removed afterwards (found by the partial indexes on the empty cells) */
+
+/* An entity falls into one cell per country pair: the distinct entities of the cell after minus before the update */
+INSERT INTO network_cube AS n (source_country, target_country, schema, industry, first_seen, at_midnight, entities)
+SELECT sc.value, tc.value, s.value, i.value, first_seen, at_midnight, entities
+FROM (
+    SELECT source_country_id, target_country_id, schema_id, industry_id, first_seen::date AS first_seen,
+           first_seen = first_seen::date AS at_midnight,
+           count(DISTINCT id) FILTER (WHERE sign > 0) - count(DISTINCT id) FILTER (WHERE sign < 0) AS entities
+    FROM entities_countries_delta
+    WHERE source_country_id != target_country_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+) c
+JOIN dim_countries sc ON (sc.id = c.source_country_id)
+JOIN dim_countries tc ON (tc.id = c.target_country_id)
+LEFT JOIN dim_schemas s ON (s.id = c.schema_id)
+LEFT JOIN dim_industries i ON (i.id = c.industry_id)
+WHERE entities != 0
+ON CONFLICT (source_country, target_country, schema, industry, first_seen, at_midnight)
+    DO UPDATE SET entities = n.entities + EXCLUDED.entities;
+
+DELETE FROM network_cube WHERE entities = 0;
+
+INSERT INTO timeline_rollup AS t (resolution, period, at_midnight, country, direction, schema, industry, entries)
+SELECT resolution, period, at_midnight, c.value, direction, s.value, i.value, entries
+FROM (
+    SELECT resolution, period, resolution = 'day' AND first_seen = first_seen::date AS at_midnight, country_id,
+           direction, schema_id, industry_id, sum(sign) AS entries
+    FROM entities_countries_delta,
+         LATERAL (VALUES ('day', first_seen::date), ('week', date_trunc('week', first_seen)::date),
+                         ('month', date_trunc('month', first_seen)::date)) r (resolution, period),
+         LATERAL (VALUES (target_country_id, 'towards'), (source_country_id, 'from')) d (country_id, direction)
+    WHERE source_country_id != target_country_id AND first_seen IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6, 7
+    HAVING sum(sign) != 0
+) r
+JOIN dim_countries c ON (c.id = r.country_id)
+LEFT JOIN dim_schemas s ON (s.id = r.schema_id)
+LEFT JOIN dim_industries i ON (i.id = r.industry_id)
+ON CONFLICT (country, direction, resolution, period, at_midnight, schema, industry)
+    DO UPDATE SET entries = t.entries + EXCLUDED.entries;
+
+DELETE FROM timeline_rollup WHERE entries = 0;
+
+/* New filter options of the affected entities */
+INSERT INTO filter_options (kind, value, label)
+WITH pairs AS (
+    SELECT DISTINCT sc.value AS source_country, tc.value AS target_country
+    FROM entities_countries_delta p
+    JOIN dim_countries sc ON (sc.id = p.source_country_id)
+    JOIN dim_countries tc ON (tc.id = p.target_country_id)
+    WHERE sign > 0
+)
+SELECT kind, alpha_2, description
+FROM (
+    SELECT 'source_country' AS kind, source_country AS alpha_2 FROM pairs
+    UNION SELECT 'target_country', target_country FROM pairs
+    UNION SELECT 'country', source_country FROM pairs
+    UNION SELECT 'country', target_country FROM pairs
+) c
+JOIN (SELECT DISTINCT ON (alpha_2) alpha_2, description FROM countries ORDER BY alpha_2, description) d USING (alpha_2)
+WHERE NOT EXISTS (SELECT FROM filter_options o WHERE o.kind = c.kind AND o.value = c.alpha_2);
+
+INSERT INTO filter_options (kind, value, label)
+SELECT DISTINCT 'schema', schema, schema FROM entities
+JOIN changed_entities USING (id)
+WHERE deleted_at IS NULL AND schema IS NOT NULL
+    AND NOT EXISTS (SELECT FROM filter_options o WHERE o.kind = 'schema' AND o.value = entities.schema);
+
+/* new snapshot version (invalidates the query cache of the dashboard) */
+UPDATE snapshot SET version = version + 1, updated_at = now();
@@ -0,0 +1,30 @@
+/* Entities that are new or changed since the last import */
+CREATE TEMP TABLE changed_entities ON COMMIT DROP AS
+SELECT u.id FROM entities_update u
+LEFT JOIN entities e USING (id)
+WHERE e.id IS NULL OR e.deleted_at IS NOT NULL OR e.last_change IS DISTINCT FROM u.last_change;
+
+/* Entities that disappeared from the snapshot */
+INSERT INTO changed_entities
+SELECT id FROM entities e
+WHERE deleted_at IS NULL AND NOT EXISTS (SELECT FROM entities_update u WHERE u.id = e.id);
+
+ALTER TABLE changed_entities ADD PRIMARY KEY (id);
+ANALYZE changed_entities;
+
+/* Tombstone disappeared entities */
+UPDATE entities e SET deleted_at = now()
+FROM changed_entities c
+WHERE e.id = c.id AND NOT EXISTS (SELECT FROM entities_update u WHERE u.id = e.id);
+
+/* Upsert new and changed entities */
+INSERT INTO entities
+    (id, caption, schema, properties, referents, datasets, first_seen, last_seen, last_change, target)
+SELECT id, caption, schema, properties, referents, datasets, first_seen, last_seen, last_change, target
+FROM entities_update
+JOIN changed_entities USING (id)
+ON CONFLICT (id) DO UPDATE SET
+    caption = EXCLUDED.caption, schema = EXCLUDED.schema, properties = EXCLUDED.properties,
+    referents = EXCLUDED.referents, datasets = EXCLUDED.datasets, first_seen = EXCLUDED.first_seen,
+    last_seen = EXCLUDED.last_seen, last_change = EXCLUDED.last_change, target = EXCLUDED.target,
+    industry = NULL, industry_confidence = NULL, deleted_at = NULL;
@@ -0,0 +1,49 @@
+/* New dictionary values of the affected entities */
+INSERT INTO dim_schemas (value)
+SELECT DISTINCT schema FROM entities e
+JOIN changed_entities USING (id)
+WHERE deleted_at IS NULL AND schema IS NOT NULL AND NOT EXISTS (SELECT FROM dim_schemas d WHERE d.value = e.schema);
+
+INSERT INTO dim_industries (value)
+SELECT DISTINCT industry FROM entities e
+JOIN changed_entities USING (id)
+WHERE deleted_at IS NULL AND industry IS NOT NULL
+    AND NOT EXISTS (SELECT FROM dim_industries d WHERE d.value = e.industry);
+
+INSERT INTO dim_countries (value)
+SELECT value FROM (
+    SELECT source_country FROM entity_datasets
+    JOIN changed_entities c ON (c.id = entity_id)
+    WHERE source_country IS NOT NULL
+    UNION
+    SELECT jsonb_array_elements_text(COALESCE(properties->'country', properties->'jurisdiction'))
+    FROM entities
+    JOIN changed_entities USING (id)
+    WHERE deleted_at IS NULL
+) c (value)
+WHERE value IS NOT NULL AND NOT EXISTS (SELECT FROM dim_countries d WHERE d.value = c.value);
+
+/* The rows of the affected entities before (sign -1) and after (sign +1) the update, the aggregates are updated
+   by these differences (sql/update_aggregates.sql) */
+CREATE TEMP TABLE entities_countries_delta ON COMMIT DROP AS
+SELECT d.*, -1 AS sign FROM entities_countries_data d WHERE id IN (SELECT id FROM changed_entities);
+
+/* Recompute the Country -sanctions-> Country rows of the affected entities */
+DELETE FROM entities_countries_data WHERE id IN (SELECT id FROM changed_entities);
+
+INSERT INTO entities_countries_data
+    (first_seen, target_country_id, source_country_id, schema_id, industry_id, id, caption)
+SELECT DISTINCT e.first_seen, tc.id, sc.id, s.id, i.id, e.id, e.caption
+FROM entities e
+JOIN changed_entities USING (id)
+JOIN entity_datasets ed ON (ed.entity_id = e.id AND ed.source_country IS NOT NULL)
+CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(e.properties->'country', e.properties->'jurisdiction'))
+    AS c(country)
+JOIN dim_countries tc ON (tc.value = c.country)
+JOIN dim_countries sc ON (sc.value = ed.source_country)
+LEFT JOIN dim_schemas s ON (s.value = e.schema)
+LEFT JOIN dim_industries i ON (i.value = e.industry)
+WHERE e.deleted_at IS NULL AND c.country IS NOT NULL;
+
+INSERT INTO entities_countries_delta
+SELECT d.*, 1 FROM entities_countries_data d WHERE id IN (SELECT id FROM changed_entities);
@@ -0,0 +1,30 @@
+/* Replace the dataset links of the affected entities */
+DELETE FROM entity_datasets WHERE entity_id IN (SELECT id FROM changed_entities);
+
+INSERT INTO entity_datasets (entity_id, dataset_name)
+SELECT u.entity_id, u.dataset_name
+FROM entity_datasets_update u
+JOIN changed_entities c ON (c.id = u.entity_id);
+
+/* The dataset metadata denormalised into the links */
+CREATE TEMP TABLE dataset_metadata ON COMMIT DROP AS
+SELECT name, title, flag, CASE WHEN type <> 'external' THEN publisher->>'country' END AS source_country
+FROM datasets
+LEFT JOIN (SELECT DISTINCT ON (alpha_2) alpha_2, flag FROM countries) c ON (publisher->>'country' = c.alpha_2);
+
+/* Entities of datasets whose publisher country changed are affected as well: their entities_countries rows and
+   the aggregates are recomputed with the changed entities (sql/update_entities_countries.sql) */
+INSERT INTO changed_entities
+SELECT DISTINCT ed.entity_id
+FROM entity_datasets ed
+JOIN dataset_metadata d ON (ed.dataset_name = d.name)
+WHERE ed.source_country IS DISTINCT FROM d.source_country
+ON CONFLICT (id) DO NOTHING;
+
+ANALYZE changed_entities;
+
+/* Denormalise the dataset metadata into new links and links of datasets whose metadata changed */
+UPDATE entity_datasets ed SET title = d.title, flag = d.flag, source_country = d.source_country
+FROM dataset_metadata d
+WHERE ed.dataset_name = d.name
+    AND (ed.title, ed.flag, ed.source_country) IS DISTINCT FROM (d.title, d.flag, d.source_country);
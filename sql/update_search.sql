@@ -0,0 +1,13 @@
+/* Recompute the searchable names of the affected entities */
+DELETE FROM entity_names WHERE id IN (SELECT id FROM changed_entities);
+
+INSERT INTO entity_names (id, name)
+SELECT DISTINCT e.id, n.name
+FROM entities e
+JOIN changed_entities USING (id)
+CROSS JOIN LATERAL (
+    SELECT e.caption
+    UNION
+    SELECT jsonb_array_elements_text(e.properties->k) FROM unnest(ARRAY['name', 'alias', 'weakAlias', 'previousName']) k
+) n(name)
+WHERE e.deleted_at IS NULL AND n.name IS NOT NULL;
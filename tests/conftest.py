@@ -0,0 +1,24 @@
+import os
+import sys
+
+import psycopg2
+import pytest
+
+ROOT_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT_DIR, "sanctions_dashboard"), os.path.join(ROOT_DIR, "util")]
+
+# SANCTIONS_TEST_DSN=<database the tests may overwrite>, the database tests are skipped without it
+TEST_DSN: [str, None] = os.environ.get("SANCTIONS_TEST_DSN")
+
+
+@pytest.fixture
+def connection():
+    if TEST_DSN is None:
+        pytest.skip("SANCTIONS_TEST_DSN is not set")
+
+    conn = psycopg2.connect(TEST_DSN)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
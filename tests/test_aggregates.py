@@ -0,0 +1,184 @@
+import os
+import subprocess
+import sys
+from collections import Counter
+from datetime import date
+
+import psycopg2
+import pytest
+
+from conftest import TEST_DSN
+from benchmark_suite import ingest_stages, UTIL_DIR
+from GenerateSyntheticData import generate_synthetic_data
+from tab_util.sanctions_by_country import timeline_query
+
+# The loaded data of the aggregates: the decoded entities_countries rows and the aggregates derived from them
+TABLES: dict[str, str] = {
+    "entities_countries": "SELECT id, caption, target_country, source_country, schema, industry, first_seen "
+                          "FROM entities_countries",
+    "network_cube": "SELECT * FROM network_cube",
+    "timeline_rollup": "SELECT * FROM timeline_rollup",
+}
+
+
+def run(*command: str) -> None:
+    subprocess.run([sys.executable, *command], cwd=UTIL_DIR, env={**os.environ, "SANCTIONS_DSN": TEST_DSN},
+                   check=True, capture_output=True)
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory) -> str:
+    # Small synthetic snapshot (with a delta of 10% changed/ removed/ new entities) loaded like in the README
+    if TEST_DSN is None:
+        pytest.skip("SANCTIONS_TEST_DSN is not set")
+
+    data: str = str(tmp_path_factory.mktemp("synthetic"))
+    generate_synthetic_data(output=data, entities="2000", datasets=20, delta=0.1, seed=7)
+
+    for name, command in ingest_stages(data):
+        if name not in ("update_entities", "export_snapshot"):
+            run(*command)
+
+    return data
+
+
+def update_entities(data: str, file: str) -> None:
+    run("ParseOpenSanctionsData.py", "update_entities", os.path.join(data, file))
+
+
+def rebuild() -> None:
+    run("BuildEntitiesCountries.py")
+
+
+def contents(connection) -> dict[str, Counter]:
+    cursor = connection.cursor()
+    result: dict[str, Counter] = {}
+
+    for table, sql in TABLES.items():
+        cursor.execute(sql)
+        result[table] = Counter(cursor.fetchall())
+
+    connection.rollback()
+    return result
+
+
+def assert_rebuild_equal(connection) -> None:
+    # The incrementally updated tables are the same as the ones a full rebuild produces
+    updated: dict[str, Counter] = contents(connection)
+    rebuild()
+    rebuilt: dict[str, Counter] = contents(connection)
+
+    for table in TABLES:
+        assert updated[table] == rebuilt[table], \
+            f"{table}: {sum((updated[table] - rebuilt[table]).values())} rows only incrementally, " \
+            f"{sum((rebuilt[table] - updated[table]).values())} rows only rebuilt"
+
+
+def test_dataset_country_change(data: str, connection):
+    update_entities(data, "entities.ftm.json")
+
+    # A dataset with entities gets the publisher country of another dataset, the entities stay the same
+    cursor = connection.cursor()
+    cursor.execute("""SELECT dataset_name, count(*) FROM entity_datasets
+        WHERE source_country IS NOT NULL GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT 1""")
+    dataset: str = cursor.fetchone()[0]
+    cursor.execute("""SELECT DISTINCT source_country FROM entity_datasets
+        WHERE source_country IS NOT NULL AND dataset_name <> %s ORDER BY 1""", (dataset,))
+    countries: list[str] = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT publisher->>'country' FROM datasets WHERE name = %s", (dataset,))
+    previous: str = cursor.fetchone()[0]
+    country: str = next(c for c in countries if c != previous)
+
+    cursor.execute("UPDATE datasets SET publisher = jsonb_set(publisher, '{country}', to_jsonb(%s::text)) "
+                   "WHERE name = %s", (country, dataset))
+    connection.commit()
+
+    update_entities(data, "entities.ftm.json")
+    assert_rebuild_equal(connection)
+
+
+def test_deltas_equal_rebuild(data: str, connection):
+    # A run of deltas (changed, removed and new entities, then back and again) without rebuilding in between
+    for file in ["entities.delta.ftm.json", "entities.ftm.json", "entities.delta.ftm.json"]:
+        update_entities(data, file)
+
+    assert_rebuild_equal(connection)
+
+
+# The same rollup cell in r and the other relation (schema and industry may be NULL)
+CELL: str = "r.period = {other}.period AND r.country = {other}.country AND r.direction = {other}.direction " \
+            "AND r.schema IS NOT DISTINCT FROM {other}.schema AND r.industry IS NOT DISTINCT FROM {other}.industry"
+
+
+def test_rollup_resolutions_sum_to_days(data: str, connection):
+    update_entities(data, "entities.ftm.json")
+    cursor = connection.cursor()
+
+    # The daily rows count the entities_countries rows of their day
+    cursor.execute(f"""SELECT count(*) FROM (
+            SELECT period, country, direction, schema, industry, sum(entries) AS entries
+            FROM timeline_rollup WHERE resolution = 'day' GROUP BY 1, 2, 3, 4, 5
+        ) r
+        FULL JOIN (
+            SELECT first_seen::date AS period, country, direction, schema, industry, count(*) AS entries
+            FROM entities_countries,
+                 LATERAL (VALUES (target_country, 'towards'), (source_country, 'from')) d (country, direction)
+            WHERE source_country != target_country AND first_seen IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5
+        ) e ON ({CELL.format(other="e")})
+        WHERE r.entries IS DISTINCT FROM e.entries""")
+    assert cursor.fetchone()[0] == 0
+
+    # The weeks (starting on Monday) and months sum up their days
+    for resolution in ("week", "month"):
+        cursor.execute(f"""SELECT count(*) FROM (
+                SELECT period, country, direction, schema, industry, entries
+                FROM timeline_rollup WHERE resolution = %(r)s
+            ) r
+            FULL JOIN (
+                SELECT date_trunc(%(r)s, period)::date AS period, country, direction, schema, industry,
+                       sum(entries) AS entries
+                FROM timeline_rollup WHERE resolution = 'day' GROUP BY 1, 2, 3, 4, 5
+            ) d ON ({CELL.format(other="d")})
+            WHERE r.entries IS DISTINCT FROM d.entries""", {"r": resolution})
+        assert cursor.fetchone()[0] == 0, resolution
+
+    cursor.execute("SELECT count(*) FROM timeline_rollup WHERE entries <= 0 OR (resolution <> 'day' AND at_midnight)")
+    assert cursor.fetchone()[0] == 0
+    connection.rollback()
+
+
+RANGES: list[tuple[[date, None], bool, [date, None]]] = [
+    (None, False, None),
+    (date(2019, 3, 14), True, date(2022, 8, 17)),
+    (date(2020, 2, 3), False, None),
+    (None, False, date(2021, 11, 30)),
+]
+
+
+@pytest.mark.parametrize("resolution", ["day", "week", "month"])
+def test_timeline_query(data: str, connection, resolution: str):
+    # The timeline (complete weeks/ months from their rollup, the partial ones from the days) counts the raw rows
+    cursor = connection.cursor()
+    cursor.execute("""SELECT target_country FROM entities_countries WHERE source_country != target_country 
+        GROUP BY 1 ORDER BY count(*) DESC LIMIT 2""")
+    countries: list[str] = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT schema FROM entities_countries GROUP BY 1 ORDER BY count(*) DESC LIMIT 1")
+    schema: str = cursor.fetchone()[0]
+
+    for mode, column in [("Sanctions towards", "target_country"), ("Sanctions from", "source_country")]:
+        for country in countries:
+            for filtered in (None, schema):
+                for start, exclusive, end in RANGES:
+                    cursor.execute(*timeline_query(mode, country, filtered, None, resolution, start, exclusive, end))
+                    timeline: dict = dict(cursor.fetchall())
+
+                    cursor.execute(f"""SELECT date_trunc(%(r)s, first_seen)::date, count(*) FROM entities_countries
+                        WHERE source_country != target_country AND {column} = %(c)s 
+                            AND (%(s)s::text IS NULL OR schema = %(s)s)
+                            AND (%(ts)s::timestamp IS NULL OR first_seen {'>' if exclusive else '>='} %(ts)s)
+                            AND (%(te)s::timestamp IS NULL OR first_seen < %(te)s)
+                        GROUP BY 1""", {"r": resolution, "c": country, "s": filtered, "ts": start, "te": end})
+                    assert timeline == dict(cursor.fetchall()), (mode, country, filtered, start, end)
+
+    connection.rollback()
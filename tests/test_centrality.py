@@ -0,0 +1,60 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_centrality import synthetic_graph
+from tab_util.centrality import sparse_centralises
+from tab_util.network import networkx_centralises
+
+METRICS: list[str] = ["Degree", "In-Degree", "Out-Degree", "Closeness", "Betweenness", "Clustering", "Pagerank"]
+TOLERANCE: float = 1e-4
+
+
+def weighted(edges: list[tuple[str, str, float]], nodes: str = "") -> nx.DiGraph:
+    graph: nx.DiGraph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_weighted_edges_from(edges)
+    return graph
+
+
+def random_graph(nodes: int, probability: float, seed: int) -> nx.DiGraph:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    graph: nx.DiGraph = nx.gnp_random_graph(nodes, probability, seed=seed, directed=True)
+    nx.set_edge_attributes(graph, {edge: rng.pareto(1.2) * 10 + 1 for edge in graph.edges}, "weight")
+    return nx.relabel_nodes(graph, {i: f"C{i:03d}" for i in graph.nodes})
+
+
+GRAPHS: dict[str, callable] = {
+    "single node": lambda: weighted([], "a"),
+    "single node with a self loop": lambda: weighted([("a", "a", 3)]),
+    "isolated nodes": lambda: weighted([], "abc"),
+    "single edge": lambda: weighted([("a", "b", 2)]),
+    "disconnected": lambda: weighted([("a", "b", 2), ("b", "c", 1), ("c", "a", 5), ("x", "y", 3), ("y", "x", 1)], "z"),
+    "self loops": lambda: weighted([("a", "a", 4), ("a", "b", 2), ("b", "a", 1), ("b", "c", 1), ("c", "a", 5),
+                                    ("c", "c", 1)]),
+    "random": lambda: random_graph(60, 0.1, seed=3),
+    "random with self loops": lambda: nx.compose(random_graph(40, 0.2, seed=7),
+                                                 weighted([("C001", "C001", 5), ("C010", "C010", 0.5)])),
+    "synthetic": lambda: synthetic_graph(120, 0.05),
+}
+
+
+@pytest.mark.parametrize("name", GRAPHS)
+def test_parity_with_networkx(name: str):
+    graph: nx.DiGraph = GRAPHS[name]()
+
+    expected: pd.DataFrame = networkx_centralises(graph).set_index("Country").sort_index()
+    result: pd.DataFrame = sparse_centralises(graph).set_index("Country").sort_index()
+
+    assert list(result.index) == list(expected.index)
+    for metric in METRICS:
+        np.testing.assert_allclose(result[metric], expected[metric], atol=TOLERANCE, err_msg=metric)
+
+
+def test_columns():
+    graph: nx.DiGraph = GRAPHS["disconnected"]()
+
+    assert list(sparse_centralises(graph).columns) == list(networkx_centralises(graph).columns)
+    assert list(sparse_centralises(graph, betweenness=False).columns) == \
+        list(networkx_centralises(graph, betweenness=False).columns)
@@ -0,0 +1,69 @@
+import pytest
+
+from tab_util.entity_search import RANK
+from tab_util.search_index import EntitySearchIndex
+
+NAMES: list[tuple[str, str, str]] = [
+    ("e1", "Gazprom Neft", "Company"), ("e1", "PJSC Gazprom Neft", "Company"), ("e2", "Rosneft Oil Company", "Company"),
+    ("e3", "Ivan Petrov", "Person"), ("e3", "Petrov Ivan Ivanovich", "Person"), ("e4", "Petra Ivanova", "Person"),
+    ("e5", "Sean O'Brien", "Person"), ("e6", "Zp Holdings Ltd", "Company"), ("e7", "Al-Rashid Trading", "Company"),
+    ("e8", "Sberbank", "Company"), ("e9", "Bank Rossiya", "Company"), ("e10", "A", "Person"),
+    ("e11", "Li Wei", "Person"), ("e12", "Wei Li Shipping Co", "Company"), ("e13", "Neftegaz", "Company"),
+    ("e14", "Kim Jong Un", "Person"), ("e15", "Ab Ltd", "Company"), ("e16", "Jabal Trading", "Company"),
+]
+
+# Short queries sit inside words without sharing a trigram (e.g. "zp" in "Gazprom")
+QUERIES: list[str] = ["zp", "ne", "a", "li", "ab", "-", "gazprom", "gazprom neft", "gasprom", "rosneft", "neft",
+                      "o'brien", "ivan petrov", "petrov", "ivan", "bank", "sber", "wei li", "kim jong un", "trading",
+                      "al-rashid", "PETRA", "  Ivan  "]
+
+MATCHES: str = f"""SELECT n.id, max({RANK}) AS rank
+    FROM entity_names n
+    JOIN entities USING (id)
+    WHERE deleted_at IS NULL AND (%(schema)s IS NULL OR schema = %(schema)s)
+        AND (lower(n.name) LIKE concat('%%', lower(%(query)s), '%%') OR lower(n.name) %% lower(%(query)s))
+    GROUP BY n.id"""
+
+
+@pytest.fixture
+def index() -> EntitySearchIndex:
+    ids, names, schemas = zip(*NAMES)
+    return EntitySearchIndex(list(ids), list(names), list(schemas))
+
+
+def ranked(ids: list[str], ranks: list[float]) -> dict[str, float]:
+    return {i: round(float(rank), 5) for i, rank in zip(ids, ranks)}
+
+
+def test_short_query_inside_a_word(index: EntitySearchIndex):
+    ids, ranks = index.search("zp")
+    assert ids == ["e6", "e1"] and ranks[0] > 2 and ranks[1] == 1.0
+
+
+def test_best_name_ranks_the_entity(index: EntitySearchIndex):
+    ids, ranks = index.search("gazprom neft")
+    assert ids[0] == "e1" and ranks[0] == 3.0 and ids.count("e1") == 1
+
+
+def test_limit_and_schema(index: EntitySearchIndex):
+    ids, ranks = index.search("ivan", limit=1)
+    assert ids == ["e3"]
+
+    ids, _ = index.search("trading", schema="Person")
+    assert ids == []
+
+
+@pytest.mark.parametrize("schema", [None, "Person", "Company"])
+def test_parity_with_sql(connection, index: EntitySearchIndex, schema: [str, None]):
+    cursor = connection.cursor()
+    cursor.execute("""CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE TEMP TABLE entity_names (id TEXT, name TEXT);
+        CREATE TEMP TABLE entities (id TEXT, schema TEXT, deleted_at TIMESTAMP);""")
+    cursor.executemany("INSERT INTO entity_names VALUES (%s, %s)", [(i, name) for i, name, _ in NAMES])
+    cursor.executemany("INSERT INTO entities VALUES (%s, %s, NULL)", sorted({(i, s) for i, _, s in NAMES}))
+
+    for query in QUERIES:
+        cursor.execute(MATCHES, {"query": query.strip(), "schema": schema})
+        expected: dict[str, float] = ranked(*zip(*cursor.fetchall())) if cursor.rowcount else {}
+
+        assert ranked(*index.search(query, schema=schema)) == expected, query
@@ -0,0 +1,125 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from DB import get_connection, pooled_connection, read_sql_file
+
+STAGING: str = "entities_countries_data_new"
+
+# Tables replaced by their staging copy <table>_new in the swap (sql/aggregates.sql builds the aggregates)
+SWAPPED: list[str] = ["entities_countries_data", "network_cube", "timeline_rollup", "filter_options"]
+
+# The dimension columns are small integers, their b-tree indexes are deduplicated and small
+INDEXES: list[str] = ["id", "first_seen", "source_country_id", "target_country_id", "schema_id", "industry_id"]
+
+# New values of the dictionaries (the existing keys are kept, so only new values draw from the identity)
+ENCODE_DIMENSIONS: str = """
+    INSERT INTO dim_schemas (value)
+    SELECT DISTINCT schema FROM entities e
+    WHERE deleted_at IS NULL AND schema IS NOT NULL AND NOT EXISTS (SELECT FROM dim_schemas d WHERE d.value = e.schema);
+
+    INSERT INTO dim_industries (value)
+    SELECT DISTINCT industry FROM entities e
+    WHERE deleted_at IS NULL AND industry IS NOT NULL 
+        AND NOT EXISTS (SELECT FROM dim_industries d WHERE d.value = e.industry);
+
+    INSERT INTO dim_countries (value)
+    SELECT value FROM (
+        SELECT source_country FROM entity_datasets WHERE source_country IS NOT NULL
+        UNION
+        SELECT jsonb_array_elements_text(COALESCE(properties->'country', properties->'jurisdiction')) 
+        FROM entities WHERE deleted_at IS NULL
+    ) c (value)
+    WHERE value IS NOT NULL AND NOT EXISTS (SELECT FROM dim_countries d WHERE d.value = c.value);"""
+
+
+def timed(phase: str, function: callable, *args) -> None:
+    started: float = time.monotonic()
+    function(*args)
+    print(f"{phase:<12} {time.monotonic() - started:8.2f}s")
+
+
+def create_staging(cursor) -> None:
+    cursor.execute(ENCODE_DIMENSIONS)
+    cursor.execute(f"""DROP TABLE IF EXISTS {STAGING};
+        CREATE TABLE {STAGING} (LIKE entities_countries_data) PARTITION BY LIST (source_country_id);
+        CREATE TABLE {STAGING}_default PARTITION OF {STAGING} DEFAULT;""")
+
+    cursor.execute("""SELECT DISTINCT d.value, d.id FROM datasets 
+        JOIN dim_countries d ON (d.value = publisher->>'country')
+        WHERE type <> 'external' AND d.value ~ '^[a-z0-9_-]+$'""")
+
+    for country, key in cursor.fetchall():
+        cursor.execute(f"CREATE TABLE {STAGING}_{country.replace('-', '_')} PARTITION OF {STAGING} "
+                       f"FOR VALUES IN (%s)", (key,))
+
+
+def load_staging(cursor) -> None:
+    cursor.execute(f"""INSERT INTO {STAGING}
+            (first_seen, target_country_id, source_country_id, schema_id, industry_id, id, caption)
+        SELECT DISTINCT e.first_seen, tc.id, sc.id, s.id, i.id, e.id, e.caption
+        FROM entities e
+        JOIN entity_datasets ed ON (ed.entity_id = e.id AND ed.source_country IS NOT NULL)
+        CROSS JOIN LATERAL jsonb_array_elements_text(COALESCE(e.properties->'country', e.properties->'jurisdiction')) 
+            AS c(country)
+        JOIN dim_countries tc ON (tc.value = c.country)
+        JOIN dim_countries sc ON (sc.value = ed.source_country)
+        LEFT JOIN dim_schemas s ON (s.value = e.schema)
+        LEFT JOIN dim_industries i ON (i.value = e.industry)
+        WHERE e.deleted_at IS NULL""")
+
+
+def create_index(column: str) -> None:
+    with pooled_connection() as conn:
+        conn.autocommit = True
+        conn.cursor().execute(f"CREATE INDEX ON {STAGING} ({column})")
+
+
+def create_indexes(workers: int) -> None:
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(create_index, INDEXES))
+
+
+def swap(cursor) -> None:
+    # DDL only: the tables are replaced by the prebuilt *_new relations (and their partitions and indexes)
+    for table in SWAPPED:
+        cursor.execute("""SELECT relname, CASE WHEN relkind IN ('i', 'I') THEN 'INDEX' ELSE 'TABLE' END FROM pg_class 
+            WHERE relnamespace = 'public'::regnamespace AND starts_with(relname, %s)""", (f"{table}_new",))
+        relations: list[tuple[str, str]] = cursor.fetchall()
+
+        # CASCADE drops the view entities_countries, which is recreated below
+        cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        for relation, kind in relations:
+            cursor.execute(f'ALTER {kind} "{relation}" RENAME TO "{table}{relation[len(table) + len("_new"):]}"')
+
+    cursor.execute(read_sql_file("entities_countries.sql"))
+
+
+def build_entities_countries(workers: int = 4) -> None:
+    started: float = time.monotonic()
+
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    timed("staging", create_staging, cursor)
+    timed("load", load_staging, cursor)
+    timed("index", create_indexes, int(workers))
+    timed("analyze", cursor.execute, f"ANALYZE {STAGING}")
+    timed("aggregates", cursor.execute, read_sql_file("aggregates.sql"))
+
+    conn.autocommit = False
+    timed("swap", swap, cursor)
+    conn.commit()
+
+    # new snapshot version (invalidates the query cache of the dashboard)
+    cursor.execute("UPDATE snapshot SET version = version + 1, updated_at = now()")
+    conn.commit()
+    conn.close()
+
+    print(f"{'total':<12} {time.monotonic() - started:8.2f}s")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    build_entities_countries(**options)
@@ -0,0 +1,104 @@
+import datetime
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_URL: str = os.environ.get("OPENSANCTIONS_URL", "https://data.opensanctions.org/datasets")
+MISSING: str = "missing"
+
+
+class DatasetFetcher:
+    def __init__(self, cache_dir: str, base_url: str = BASE_URL, workers: int = 8, offline: bool = False,
+                 retries: int = 100, timeout: float = 10.0):
+        self.cache_dir: str = cache_dir
+        self.base_url: str = base_url.rstrip("/")
+        self.workers: int = workers
+        self.offline: bool = offline
+        self.retries: int = retries
+        self.timeout: float = timeout
+
+        retry: Retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                             allowed_methods=["GET"])
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+
+        self.session: requests.Session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def ref_path(self, date: datetime.date, name: str) -> str:
+        return os.path.join(self.cache_dir, "refs", date.strftime('%Y%m%d'), f"{name}.ref")
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.json")
+
+    def load(self, date: datetime.date, name: str) -> (bool, [dict, None]):
+        ref_path: str = self.ref_path(date, name)
+        if not os.path.exists(ref_path):
+            return False, None
+
+        with open(ref_path) as f:
+            digest: str = f.read().strip()
+
+        if digest == MISSING:
+            return True, None
+
+        with open(self.object_path(digest), "rb") as f:
+            return True, json.loads(f.read())
+
+    def store(self, date: datetime.date, name: str, content: [bytes, None]) -> None:
+        digest: str = MISSING if content is None else hashlib.sha256(content).hexdigest()
+
+        if content is not None:
+            os.makedirs(os.path.dirname(self.object_path(digest)), exist_ok=True)
+            with open(self.object_path(digest), "wb") as f:
+                f.write(content)
+
+        os.makedirs(os.path.dirname(self.ref_path(date, name)), exist_ok=True)
+        with open(self.ref_path(date, name), "w") as f:
+            f.write(digest)
+
+    def fetch_day(self, date: datetime.date, name: str) -> [dict, None]:
+        cached, data = self.load(date, name)
+        if cached or self.offline:
+            return data
+
+        url: str = f"{self.base_url}/{date.strftime('%Y%m%d')}/{name}/index.json"
+
+        # Connection errors, timeouts and exhausted retries are raised (nothing is cached, the next run tries again)
+        response: requests.Response = self.session.get(url, timeout=self.timeout)
+
+        if response.status_code == 200:
+            data: dict = response.json()
+            self.store(date, name, response.content)
+            return data
+
+        # Publications of past days do not change anymore, the current day might still be published later
+        if response.status_code == 404 and date < datetime.date.today():
+            self.store(date, name, None)
+
+        return None
+
+    def fetch(self, date: datetime.date, name: str) -> [dict, None]:
+        # Falls back to the previous days while a day is not published (404). A connection error or timeout ends the
+        # walk back: the other days would only wait for the same unreachable server
+        for days in range(self.retries + 1):
+            try:
+                data: [dict, None] = self.fetch_day(date - datetime.timedelta(days=days), name)
+            except requests.RequestException as e:
+                print(f"Fetching {name} failed: {e}", file=sys.stderr)
+                return None
+
+            if data is not None:
+                return data
+
+        return None
+
+    def fetch_all(self, date: datetime.date, names: list[str]) -> dict:
+        with ThreadPoolExecutor(self.workers) as executor:
+            return dict(zip(names, executor.map(lambda name: self.fetch(date, name), names)))
@@ -0,0 +1,123 @@
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from DB import get_connection, ROOT_DIR
+
+# SNAPSHOT_DIR=<directory of the snapshots>, the dashboard reads <SNAPSHOT_DIR>/current (QUERY_BACKEND=duckdb)
+SNAPSHOT_DIR: str = os.environ.get("SNAPSHOT_DIR", os.path.join(ROOT_DIR, "data", "snapshot"))
+
+# The tables (and columns) queried by the dashboard
+SNAPSHOT_TABLES: dict[str, str] = {
+    "entities": """SELECT id, caption, schema, first_seen, last_seen, last_change, target, industry, deleted_at
+        FROM entities WHERE deleted_at IS NULL""",
+    "entity_names": "SELECT id, name FROM entity_names",
+    "entity_datasets": "SELECT entity_id, dataset_name, title, flag, source_country FROM entity_datasets",
+    "entities_countries": """SELECT id, caption, target_country, source_country, schema, first_seen, industry, 
+        target_country_id, source_country_id, schema_id, industry_id FROM entities_countries""",
+    "dim_countries": "SELECT id, value FROM dim_countries",
+    "dim_schemas": "SELECT id, value FROM dim_schemas",
+    "dim_industries": "SELECT id, value FROM dim_industries",
+    "countries": "SELECT alpha_2, alpha_3, flag, name, description FROM countries",
+    "datasets": "SELECT name, title, url, summary, publisher, type FROM datasets",
+    "network_cube": "SELECT * FROM network_cube",
+    "timeline_rollup": "SELECT * FROM timeline_rollup",
+    "filter_options": "SELECT kind, value, label FROM filter_options",
+}
+
+# PostgreSQL type oid -> Arrow type (everything else, e.g. JSON, is exported as text)
+ARROW_TYPES: dict[int, pa.DataType] = {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(), 700: pa.float32(), 701: pa.float64(),
+    1700: pa.float64(), 1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+}
+
+
+def arrow_column(values: tuple, data_type: pa.DataType) -> pa.Array:
+    if pa.types.is_string(data_type):
+        values = [None if v is None else v if isinstance(v, str) else json.dumps(v) for v in values]
+
+    return pa.array(values, type=data_type)
+
+
+def export_table(conn, name: str, sql: str, path: str, batch_size: int) -> int:
+    # Named (server side) cursor, the table is fetched in batches
+    cursor = conn.cursor(name=f"snapshot_{name}")
+    cursor.itersize = batch_size
+    cursor.execute(sql)
+
+    writer, rows = None, 0
+    while True:
+        batch: list[tuple] = cursor.fetchmany(batch_size)
+
+        if writer is None:
+            schema: pa.Schema = pa.schema([(c.name, ARROW_TYPES.get(c.type_code, pa.string()))
+                                           for c in cursor.description])
+            writer = pq.ParquetWriter(path, schema, compression="zstd")
+
+        if len(batch) == 0:
+            break
+
+        columns: list[tuple] = list(zip(*batch))
+        writer.write_table(pa.table([arrow_column(values, f.type) for values, f in zip(columns, writer.schema)],
+                                    schema=writer.schema))
+        rows += len(batch)
+
+    writer.close()
+    cursor.close()
+    return rows
+
+
+def publish(directory: str, keep: int) -> None:
+    # The link is replaced atomically, workers still reading the previous snapshot keep their files
+    link: str = os.path.join(SNAPSHOT_DIR, "current")
+    tmp: str = f"{link}.tmp"
+
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+
+    os.symlink(os.path.basename(directory), tmp)
+    os.replace(tmp, link)
+
+    snapshots: list[str] = sorted(d for d in os.listdir(SNAPSHOT_DIR) if d.startswith("v"))
+    for old in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(SNAPSHOT_DIR, old), ignore_errors=True)
+
+
+def export_snapshot(batch_size: int = 100_000, keep: int = 2) -> None:
+    batch_size, keep = int(batch_size), max(int(keep), 1)
+    started: float = time.monotonic()
+
+    conn = get_connection()
+    # REPEATABLE READ: all tables are read from the same database snapshot
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cursor = conn.cursor()
+    cursor.execute("SELECT max(version) FROM snapshot")
+    version: int = cursor.fetchone()[0]
+
+    directory: str = os.path.join(SNAPSHOT_DIR, f"v{version:08d}_{int(time.time())}")
+    os.makedirs(directory)
+    tables: dict[str, int] = {}
+
+    for name, sql in SNAPSHOT_TABLES.items():
+        table_started: float = time.monotonic()
+        tables[name] = export_table(conn, name, sql, os.path.join(directory, f"{name}.parquet"), batch_size)
+        print(f"{name:<20} {tables[name]:>10} rows {time.monotonic() - table_started:8.2f}s")
+
+    conn.close()
+
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump({"version": version, "created": datetime.datetime.now().isoformat(), "tables": tables}, f)
+
+    publish(directory, keep)
+    print(f"{'total':<20} {time.monotonic() - started:19.2f}s -> {directory}")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    export_snapshot(**options)
@@ -0,0 +1,195 @@
+import csv
+import datetime
+import json
+import os
+import random
+import re
+import sys
+
+from DB import ROOT_DIR, SQL_DIR
+from DatasetFetcher import DatasetFetcher
+from Progress import Progress
+
+SCALES: dict[str, int] = {"k": 1_000, "m": 1_000_000}
+
+# Most sanctioned countries first, the remaining countries follow in the order of sql/countries.sql
+TARGET_COUNTRIES: list[str] = ["ru", "ir", "kp", "sy", "by", "cn", "ve", "mm", "cu", "ua", "af", "iq", "lb", "ye", "ly",
+                               "sd", "so", "ni", "ml", "cd", "ae", "tr", "kz", "ge", "am"]
+PUBLISHER_COUNTRIES: list[str] = ["us", "gb", "fr", "ca", "ch", "au", "ua", "jp", "nz", "be", "nl", "pl", "de", "it",
+                                  "es", "se", "no", "ee", "lt", "lv"]
+
+# schema -> share of the entities
+SCHEMAS: dict[str, float] = {"Person": 0.5, "Company": 0.25, "Organization": 0.12, "LegalEntity": 0.08, "Vessel": 0.05}
+LEGAL_FORMS: list[str] = ["LLC", "Ltd", "JSC", "OOO", "GmbH", "PJSC", "Inc", "Co", "SA", "Limited"]
+INDUSTRIES: list[str] = ["oil & energy", "banking", "financial services", "mining & metals", "shipbuilding",
+                         "maritime", "defense & space", "aviation & aerospace", "chemicals",
+                         "logistics and supply chain", "import and export", "telecommunications", "information technology and services",
+                         "construction", "real estate", "wholesale", "machinery", "electrical/electronic manufacturing",
+                         "investment management", "government administration"]
+
+SYLLABLES: list[str] = ["ka", "lo", "vin", "ser", "gei", "an", "dre", "mi", "kha", "il", "to", "va", "ro", "sta", "nis",
+                        "lav", "pe", "tr", "ov", "ich", "na", "zar", "bek", "al", "ex", "yu", "ri", "dim", "os", "tek",
+                        "gaz", "prom", "neft", "trans", "bal", "tic", "mar", "in", "vest", "kom"]
+
+CSV_HEADER: list[str] = ["", "name", "domain", "year founded", "industry", "size range", "locality", "country",
+                         "linkedin url", "current employee estimate", "total employee estimate"]
+
+
+def parse_scale(value: [str, int]) -> int:
+    # 10k, 1m, 10m or a plain number
+    value = str(value).lower().strip()
+    return int(float(value[:-1]) * SCALES[value[-1]]) if value[-1] in SCALES else int(value)
+
+
+def load_countries() -> dict[str, str]:
+    countries: dict[str, str] = {}
+
+    with open(os.path.join(SQL_DIR, "countries.sql"), encoding="utf-8") as f:
+        for alpha_2, name in re.findall(r"VALUES \('([a-z]{2})', '[a-z]{3}', '[^']*', '((?:[^']|'')*)'", f.read()):
+            countries.setdefault(alpha_2, name.replace("''", "'"))
+
+    return countries
+
+
+class Generator:
+    def __init__(self, seed: int, countries: dict[str, str], datasets: int):
+        self.rng: random.Random = random.Random(seed)
+        self.countries: dict[str, str] = countries
+
+        # Zipf like skew: the k-th country/ dataset is chosen with a weight of 1/k
+        targets: list[str] = [c for c in TARGET_COUNTRIES if c in countries]
+        self.targets: list[str] = targets + [c for c in countries if c not in targets]
+        self.target_weights: list[float] = [1 / (k + 1) ** 1.2 for k in range(len(self.targets))]
+
+        self.datasets: list[dict] = self.create_datasets(datasets)
+        self.dataset_weights: list[float] = [1 / (k + 1) for k in range(len(self.datasets))]
+
+    def create_datasets(self, count: int) -> list[dict]:
+        datasets: list[dict] = []
+
+        for k in range(count):
+            # Every 10th dataset is an external source (e.g. wikidata) without a sanctioning country
+            external: bool = k % 10 == 9
+            country: str = PUBLISHER_COUNTRIES[k % len(PUBLISHER_COUNTRIES)]
+            name: str = f"ext_source_{k}" if external else f"{country}_sanctions_{k}"
+
+            datasets.append({
+                "name": name, "title": name.replace("_", " ").title(), "url": f"https://example.org/{name}",
+                "index_url": f"https://data.opensanctions.org/datasets/latest/{name}/index.json",
+                "summary": f"Synthetic dataset {k}", "description": f"Synthetic dataset {k} for benchmarks",
+                "publisher": {"name": f"Publisher {k}", "country": None if external else country,
+                              "official": not external},
+                "type": "external" if external else "source"})
+
+        return datasets
+
+    def word(self, syllables: int) -> str:
+        return "".join(self.rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+    def name(self, schema: str) -> str:
+        if schema == "Person":
+            return f"{self.word(self.rng.randint(2, 3))} {self.word(self.rng.randint(2, 4))}"
+
+        if schema == "Vessel":
+            return f"{self.word(2).upper()} {self.rng.randint(1, 99)}"
+
+        return f"{self.word(self.rng.randint(2, 4))} {self.word(2)} {self.rng.choice(LEGAL_FORMS)}"
+
+    def timestamp(self, start: datetime.datetime, days: int) -> str:
+        return (start + datetime.timedelta(days=self.rng.randint(0, days), seconds=self.rng.randint(0, 86399))
+                ).isoformat(timespec="seconds")
+
+    def entity(self, i: int) -> dict:
+        schema: str = self.rng.choices(list(SCHEMAS), weights=list(SCHEMAS.values()))[0]
+        name: str = self.name(schema)
+        countries: list[str] = list(dict.fromkeys(self.rng.choices(self.targets, self.target_weights,
+                                                                   k=self.rng.choice([1, 1, 1, 2, 3]))))
+        datasets: list[str] = list(dict.fromkeys(d["name"] for d in self.rng.choices(
+            self.datasets, self.dataset_weights, k=self.rng.choice([1, 1, 2, 2, 3, 4]))))
+
+        properties: dict = {"name": [name], "country" if schema != "Company" or i % 2 else "jurisdiction": countries}
+        if self.rng.random() < 0.4:
+            properties["alias"] = [self.name(schema) for _ in range(self.rng.randint(1, 3))]
+        if self.rng.random() < 0.1:
+            properties["weakAlias"] = [self.word(2)]
+        if self.rng.random() < 0.05:
+            properties["previousName"] = [self.name(schema)]
+
+        first_seen: str = self.timestamp(datetime.datetime(2015, 1, 1), 3500)
+
+        return {"id": f"syn-{i:09d}", "caption": name, "schema": schema, "properties": properties,
+                "referents": [f"ref-{i}"] if self.rng.random() < 0.2 else [], "datasets": datasets,
+                "first_seen": first_seen, "last_seen": "2025-01-01T00:00:00",
+                "last_change": max(first_seen, self.timestamp(datetime.datetime(2020, 1, 1), 1800)),
+                "target": self.rng.random() < 0.8}
+
+    def company(self, i: int, name: [str, None]) -> list:
+        country: str = self.countries[self.rng.choices(self.targets, self.target_weights)[0]].lower()
+        employees: int = int(self.rng.paretovariate(1.1) * 5)
+
+        return [i, (name or self.name("Company")).lower(), f"company{i}.com", f"{self.rng.randint(1900, 2023)}.0",
+                self.rng.choice(INDUSTRIES), "1 - 10" if employees < 10 else "11 - 50", f"city {i % 997}, {country}",
+                country, f"linkedin.com/company/c{i}", employees, employees * 2]
+
+
+def generate_synthetic_data(output: str = os.path.join(ROOT_DIR, "data", "synthetic"), entities: str = "10k",
+                            companies: str = None, datasets: int = 60, delta: float = 0.01, seed: int = 42) -> None:
+    entities = parse_scale(entities)
+    companies = parse_scale(companies) if companies is not None else entities // 2
+    delta, seed = float(delta), int(seed)
+
+    os.makedirs(output, exist_ok=True)
+    generator: Generator = Generator(seed, load_countries(), int(datasets))
+    changes: random.Random = random.Random(seed + 1)
+
+    # index.json and the dataset documents in the cache of download_datasets (offline=true)
+    with open(os.path.join(output, "index.json"), "w") as f:
+        json.dump({"datasets": [d["name"] for d in generator.datasets]}, f)
+
+    fetcher: DatasetFetcher = DatasetFetcher(os.path.join(output, "cache"), offline=True)
+    for dataset in generator.datasets:
+        fetcher.store(datetime.date.today(), dataset["name"], json.dumps(dataset).encode())
+
+    # The companies share the names of some of the company entities, so the industries can be matched
+    company_names: list[str] = []
+    progress: Progress = Progress("Entities")
+
+    # entities.delta.ftm.json: the next day, with changed, removed and new entities (update_entities)
+    with open(os.path.join(output, "entities.ftm.json"), "w") as full, \
+            open(os.path.join(output, "entities.delta.ftm.json"), "w") as update:
+        for i in range(entities):
+            entity: dict = generator.entity(i)
+            full.write(json.dumps(entity) + "\n")
+            progress.update(i + 1)
+
+            if entity["schema"] == "Company" and len(company_names) < companies // 2 and i % 3 == 0:
+                company_names.append(entity["caption"])
+
+            draw: float = changes.random()
+            if draw < delta:
+                continue
+
+            if draw < 2 * delta:
+                entity["datasets"] = entity["datasets"][:1] + [generator.datasets[0]["name"]]
+                entity["last_change"] = "2025-01-02T00:00:00"
+
+            update.write(json.dumps(entity) + "\n")
+
+        for i in range(entities, entities + int(entities * delta)):
+            update.write(json.dumps(generator.entity(i)) + "\n")
+
+    progress.finish()
+
+    with open(os.path.join(output, "companies.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+
+        for i in range(companies):
+            writer.writerow(generator.company(i, company_names[i] if i < len(company_names) else None))
+
+    print(f"{entities:,} entities, {companies:,} companies, {len(generator.datasets)} datasets -> {output}")
+
+
+if __name__ == '__main__':
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+    generate_synthetic_data(**options)
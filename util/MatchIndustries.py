@@ -0,0 +1,160 @@
+import io
+import re
+import sys
+import time
+import unicodedata
+
+from DB import get_connection, copy_line, copy_rows
+from Progress import Progress
+
+LEGAL_FORMS: set[str] = {
+    "ab", "ag", "ao", "as", "bv", "cjsc", "co", "company", "corp", "corporation", "cv", "gmbh", "inc", "incorporated",
+    "jsc", "kg", "limited", "llc", "llp", "lp", "ltd", "nv", "oao", "ojsc", "ooo", "oy", "pao", "pjsc", "plc", "pte",
+    "pty", "sa", "sarl", "sas", "se", "spa", "srl", "zao"
+}
+NON_WORD: re.Pattern = re.compile(r"[\W_]+")
+
+
+def normalise_name(name: [str, None]) -> [str, None]:
+    if name is None:
+        return None
+
+    name = "".join(c for c in unicodedata.normalize("NFKD", name.casefold()) if not unicodedata.combining(c))
+    tokens: list[str] = NON_WORD.sub(" ", name).split()
+
+    while len(tokens) > 1 and tokens[-1] in LEGAL_FORMS:
+        tokens.pop()
+
+    while len(tokens) > 1 and tokens[0] in LEGAL_FORMS:
+        tokens.pop(0)
+
+    return " ".join(tokens) or None
+
+
+def copy_name_keys(conn, cursor, select: str, table: str, batch_size: int, label: str) -> int:
+    source = conn.cursor(name=f"{table}_source")
+    source.itersize = batch_size
+    source.execute(select)
+
+    progress: Progress = Progress(label)
+    buffer: io.StringIO = io.StringIO()
+    count: int = 0
+
+    for count, (key, value) in enumerate(source, 1):
+        name_key: [str, None] = normalise_name(value)
+        if name_key is not None:
+            buffer.write(copy_line([key, name_key]))
+
+        if count % batch_size == 0:
+            copy_rows(cursor, table, ["key", "name_key"], buffer)
+            buffer = io.StringIO()
+
+        progress.update(count)
+
+    copy_rows(cursor, table, ["key", "name_key"], buffer)
+    source.close()
+    progress.finish()
+
+    return count
+
+
+def build_name_index(batch_size: int = 100_000, trigram: bool = False) -> None:
+    trigram = str(trigram).lower() in ("1", "true", "yes")
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("CREATE TEMP TABLE company_name_keys (key INTEGER, name_key TEXT) ON COMMIT DROP")
+    copy_name_keys(conn, cursor, "SELECT id, name FROM companies", "company_name_keys", int(batch_size), "Companies")
+
+    cursor.execute("""TRUNCATE company_names;
+        INSERT INTO company_names (name_key, industry, companies)
+        SELECT name_key, mode() WITHIN GROUP (ORDER BY industry), count(*)
+        FROM company_name_keys
+        JOIN companies ON (id = key)
+        WHERE industry IS NOT NULL
+        GROUP BY name_key;
+        ANALYZE company_names;""")
+
+    if trigram:
+        cursor.execute("""CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            DROP INDEX IF EXISTS company_names_name_key_trgm_idx;
+            CREATE INDEX company_names_name_key_trgm_idx ON company_names USING gin (name_key gin_trgm_ops);""")
+
+    cursor.execute("SELECT count(*) FROM company_names")
+    print(f"Indexed {cursor.fetchone()[0]:,} normalised company names")
+
+    conn.commit()
+    conn.close()
+
+
+def match_entities(conn, cursor, restriction: str = "TRUE", batch_size: int = 100_000, fuzzy: bool = False,
+                   threshold: float = 0.6) -> (int, int, int):
+    cursor.execute("CREATE TEMP TABLE entity_name_keys (key TEXT, name_key TEXT) ON COMMIT DROP")
+    total: int = copy_name_keys(
+        conn, cursor, f"SELECT id, caption FROM entities WHERE schema = 'Company' AND deleted_at IS NULL AND {restriction}",
+        "entity_name_keys", batch_size, "Entities")
+
+    cursor.execute("""ANALYZE entity_name_keys;
+        UPDATE entities e SET industry = c.industry, industry_confidence = 1
+        FROM entity_name_keys k
+        JOIN company_names c USING (name_key)
+        WHERE e.id = k.key""")
+    exact: int = cursor.rowcount
+
+    similar: int = 0
+    if fuzzy:
+        # The extension is only created by build_name_index with trigram=true (which also indexes the names)
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", (str(threshold),))
+        cursor.execute("""UPDATE entities e SET industry = m.industry, industry_confidence = m.score
+            FROM (
+                SELECT DISTINCT ON (k.key) k.key, c.industry, similarity(k.name_key, c.name_key) AS score
+                FROM entity_name_keys k
+                JOIN company_names c ON (c.name_key % k.name_key)
+                WHERE NOT EXISTS (SELECT FROM company_names x WHERE x.name_key = k.name_key)
+                ORDER BY k.key, score DESC
+            ) m
+            WHERE e.id = m.key""")
+        similar = cursor.rowcount
+
+    cursor.execute("DROP TABLE entity_name_keys")
+
+    return total, exact, similar
+
+
+def match_industries(batch_size: int = 100_000, fuzzy: bool = False, threshold: float = 0.6) -> None:
+    fuzzy = str(fuzzy).lower() in ("1", "true", "yes")
+    started: float = time.monotonic()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("UPDATE entities SET industry = NULL, industry_confidence = NULL WHERE industry IS NOT NULL")
+    total, exact, similar = match_entities(conn, cursor, batch_size=int(batch_size), fuzzy=fuzzy,
+                                           threshold=float(threshold))
+
+    conn.commit()
+    conn.close()
+
+    rate: float = (exact + similar) / total if total > 0 else 0
+    print(f"Matched {exact + similar:,} of {total:,} companies ({rate:.1%}; {exact:,} exact, {similar:,} fuzzy) "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    modes: list[tuple] = [
+        ("build_name_index", build_name_index, "[batch_size=100000] [trigram=false]"),
+        ("match_industries", match_industries, "[batch_size=100000] [fuzzy=false] [threshold=0.6]")
+    ]
+
+    if len(sys.argv) < 2 or sys.argv[1] not in list(map(lambda x: x[0], modes)):
+        msg = "Please provide mode (and optional key=value options). \nAvailable modes: "
+        msg += ';'.join(map(lambda x: x[0] + ' ' + x[2], modes))
+        exit(msg)
+
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+
+    for mode in modes:
+        if sys.argv[1] == mode[0]:
+            mode[1](**options)
@@ -1,53 +1,265 @@
+import io
 import json
+import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
 
-import requests
 import datetime
 from colorama import Fore, Style
 
-from DB import get_connection
+from DB import get_connection, copy_line, copy_rows, read_sql_file
+from DatasetFetcher import DatasetFetcher, BASE_URL
+from MatchIndustries import match_entities
+from Progress import Progress
 
+ENTITY_COLUMNS: list[str] = ["id", "caption", "schema", "properties", "referents", "datasets", "first_seen", "last_seen",
+                             "last_change", "target"]
+LINK_COLUMNS: list[str] = ["entity_id", "dataset_name"]
+
+
+def entity_to_row(entity: dict) -> list:
+    caption = entity['caption'] if len(entity['caption']) < 256 else entity['caption'][:253] + "..."
+
+    return [entity['id'], caption, entity['schema'], json.dumps(entity['properties']), json.dumps(entity['referents']),
+            json.dumps(entity['datasets']), entity['first_seen'], entity['last_seen'], entity['last_change'],
+            entity['target']]
+
+
+def entity_to_lines(line: [str, bytes]) -> (str, str):
+    entity: dict = json.loads(line)
+    links: str = "".join(copy_line([entity['id'], name]) for name in entity['datasets'])
+
+    return copy_line(entity_to_row(entity)), links
+
+
+def copy_entities(cursor, entities: [str, io.StringIO], links: [str, io.StringIO], suffix: str = "") -> None:
+    copy_rows(cursor, f"entities{suffix}", ENTITY_COLUMNS, entities)
+    copy_rows(cursor, f"entity_datasets{suffix}", LINK_COLUMNS, links)
+
+
+def read_checkpoint(cursor, input_file: str) -> (int, int):
+    cursor.execute("SELECT byte_offset, line FROM load_checkpoints WHERE input_file = %s",
+                   (os.path.abspath(input_file),))
+    checkpoint: [tuple, None] = cursor.fetchone()
+
+    return (0, 0) if checkpoint is None else (int(checkpoint[0]), int(checkpoint[1]))
+
+
+def write_checkpoint(cursor, input_file: str, offset: int, line: int) -> None:
+    # Executed in the transaction of the batch, so the checkpoint is stored if and only if the batch is
+    cursor.execute("""INSERT INTO load_checkpoints (input_file, byte_offset, line) VALUES (%s, %s, %s) 
+        ON CONFLICT (input_file) DO UPDATE SET byte_offset = EXCLUDED.byte_offset, line = EXCLUDED.line""",
+                   (os.path.abspath(input_file), offset, line))
+
+
+def clear_checkpoint(conn, cursor, input_file: str) -> None:
+    cursor.execute("DELETE FROM load_checkpoints WHERE input_file = %s", (os.path.abspath(input_file),))
+    conn.commit()
+
+
+def write_entities(input_file: str, batch_size: int = 10_000, offset: int = None, line: int = None) -> None:
+    batch_size = int(batch_size)
 
-def write_entities(input_file: str) -> None:
     conn = get_connection()
     cursor = conn.cursor()
 
-    with open(input_file, 'r', encoding="UTF-8") as fd:
-        for count, entity in enumerate(fd):
-            print("\rLine: ", count, end="")
+    if offset is None and line is None:
+        offset, line = read_checkpoint(cursor, input_file)
 
-            entity = json.loads(entity)
+    progress: Progress = Progress("Line")
 
-            caption = entity['caption'] if len(entity['caption']) < 256 else entity['caption'][:253] + "..."
+    with open(input_file, 'rb') as fd:
+        fd.seek(int(offset or 0))
+        line = int(line or 0)
 
-            cursor.execute(
-                """INSERT INTO public.entities 
-                    (id, caption, schema, properties, referents, datasets, first_seen, last_seen, last_change, target) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (entity['id'], caption, entity['schema'], json.dumps(entity['properties']),
-                 json.dumps(entity['referents']), json.dumps(entity['datasets']), entity['first_seen'],
-                 entity['last_seen'], entity['last_change'], entity['target']))
+        if offset is None:
+            for _ in range(line):
+                fd.readline()
+
+        if line > 0 or fd.tell() > 0:
+            print(f"Resuming at line {line} (byte {fd.tell()})")
+
+        buffer, links = io.StringIO(), io.StringIO()
+        batch: int = 0
+
+        for raw in iter(fd.readline, b""):
+            line += 1
+            if not raw.strip():
+                continue
+
+            entity, entity_links = entity_to_lines(raw)
+            buffer.write(entity)
+            links.write(entity_links)
+            batch += 1
+
+            if batch == batch_size:
+                copy_entities(cursor, buffer, links)
+                write_checkpoint(cursor, input_file, fd.tell(), line)
+                conn.commit()
+                buffer, links, batch = io.StringIO(), io.StringIO(), 0
+
+            progress.update(line)
+
+        if batch > 0:
+            copy_entities(cursor, buffer, links)
+            write_checkpoint(cursor, input_file, fd.tell(), line)
+            conn.commit()
+
+    progress.finish()
+    clear_checkpoint(conn, cursor, input_file)
+    conn.close()
+
+
+def update_entities(input_file: str, batch_size: int = 10_000, fuzzy: bool = False) -> None:
+    batch_size = int(batch_size)
+    fuzzy = str(fuzzy).lower() in ("1", "true", "yes")
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    progress: Progress = Progress("Line")
+
+    cursor.execute(f"""CREATE TEMP TABLE entities_update ON COMMIT DROP AS 
+        SELECT {', '.join(ENTITY_COLUMNS)} FROM entities WITH NO DATA""")
+    cursor.execute(f"""CREATE TEMP TABLE entity_datasets_update ON COMMIT DROP AS 
+        SELECT {', '.join(LINK_COLUMNS)} FROM entity_datasets WITH NO DATA""")
+
+    with open(input_file, 'rb') as fd:
+        buffer, links = io.StringIO(), io.StringIO()
+        line: int = 0
+
+        for line, raw in enumerate(fd, 1):
+            if not raw.strip():
+                continue
+
+            entity, entity_links = entity_to_lines(raw)
+            buffer.write(entity)
+            links.write(entity_links)
+
+            if line % batch_size == 0:
+                copy_entities(cursor, buffer, links, "_update")
+                buffer, links = io.StringIO(), io.StringIO()
+
+            progress.update(line)
+
+        copy_entities(cursor, buffer, links, "_update")
+
+    progress.finish()
+
+    cursor.execute("ALTER TABLE entities_update ADD PRIMARY KEY (id); ANALYZE entities_update;")
+    cursor.execute(read_sql_file("update_entities.sql"))
+    cursor.execute("""SELECT count(*) FILTER (WHERE u.id IS NOT NULL), count(*) FILTER (WHERE u.id IS NULL) 
+        FROM changed_entities LEFT JOIN entities_update u USING (id)""")
+    upserted, tombstoned = cursor.fetchone()
+
+    # adds the entities of datasets with a new publisher country to changed_entities
+    cursor.execute(read_sql_file("update_entity_datasets.sql"))
+    cursor.execute("SELECT count(*) FROM changed_entities")
+    relinked: int = cursor.fetchone()[0] - upserted - tombstoned
+
+    match_entities(conn, cursor, "id IN (SELECT id FROM changed_entities)", fuzzy=fuzzy)
+    cursor.execute(read_sql_file("update_entities_countries.sql"))
+    cursor.execute(read_sql_file("update_search.sql"))
+    cursor.execute(read_sql_file("update_aggregates.sql"))
 
     conn.commit()
     conn.close()
 
+    print(f"Upserted {upserted:,} new or changed entities, tombstoned {tombstoned:,} entities, "
+          f"{relinked:,} entities of datasets with a new publisher country")
+
+
+def find_shards(input_file: str, shard_size: int, offset: int = 0) -> list[tuple[int, int]]:
+    size: int = os.path.getsize(input_file)
+    shards: list[tuple[int, int]] = []
+
+    with open(input_file, 'rb') as fd:
+        start: int = offset
+        while start < size:
+            fd.seek(min(start + shard_size, size))
+            fd.readline()
+            shards.append((start, fd.tell()))
+            start = fd.tell()
+
+    return shards
+
+
+def encode_shard(input_file: str, start: int, end: int) -> (int, int, str, str):
+    with open(input_file, 'rb') as fd:
+        fd.seek(start)
+        lines: list[bytes] = fd.read(end - start).splitlines()
+
+    rows: list[tuple[str, str]] = [entity_to_lines(line) for line in lines if line.strip()]
+    return end, len(lines), "".join(entity for entity, _ in rows), "".join(links for _, links in rows)
+
+
+def write_entities_parallel(input_file: str, workers: int = os.cpu_count(), shard_size: int = 8 * 2 ** 20,
+                            offset: int = None) -> None:
+    workers = int(workers)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    offset, line = read_checkpoint(cursor, input_file) if offset is None else (int(offset), 0)
+    shards: list[tuple[int, int]] = find_shards(input_file, int(shard_size), offset)
+
+    if offset > 0:
+        print(f"Resuming at byte {offset}")
+
+    progress: Progress = Progress("Line")
+
+    def write_shard(future: Future) -> None:
+        nonlocal line
+        end, count, entities, links = future.result()
+
+        line += count
+        copy_entities(cursor, entities, links)
+        write_checkpoint(cursor, input_file, end, line)
+        conn.commit()
+
+        progress.update(line)
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending: deque[Future] = deque()
+
+        for start, end in shards:
+            pending.append(executor.submit(encode_shard, input_file, start, end))
+
+            if len(pending) >= 2 * workers:
+                write_shard(pending.popleft())
+
+        while pending:
+            write_shard(pending.popleft())
+
+    progress.finish()
+    clear_checkpoint(conn, cursor, input_file)
+    conn.close()
+
 
-def download_datasets(input_file: str) -> None:
+def download_datasets(input_file: str, workers: int = 8, cache_dir: str = None, offline: bool = False,
+                      base_url: str = BASE_URL) -> None:
     with open(input_file, 'r') as f:
         sanctions_index: json = json.load(f)
 
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(input_file)), "cache")
+    offline = str(offline).lower() in ("1", "true", "yes")
+    fetcher: DatasetFetcher = DatasetFetcher(cache_dir, base_url, int(workers), offline)
+
+    datasets: dict = fetcher.fetch_all(datetime.date.today(), sanctions_index["datasets"])
+
     conn = get_connection()
     cursor = conn.cursor()
 
-    for name in sanctions_index["datasets"]:
+    for name, data in datasets.items():
         print("Saving dataset: ", name, end=" ")
 
-        data: json = download_dataset(datetime.date.today(), name)
-
         if data is not None:
             cursor.execute(
                 """INSERT INTO datasets (name, title, url, index_url, summary, description, publisher, type) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (name) DO UPDATE SET title = EXCLUDED.title, url = EXCLUDED.url, 
+                        index_url = EXCLUDED.index_url, summary = EXCLUDED.summary, 
+                        description = EXCLUDED.description, publisher = EXCLUDED.publisher, type = EXCLUDED.type""",
                 (data['name'], data['title'], data['url'] if "url" in data else None, data['index_url'],
                  data['summary'] if 'summary' in data else None, data['description'] if "description" in data else None,
                  json.dumps(data['publisher']) if "publisher" in data else None, data['type']))
@@ -58,19 +270,6 @@ def download_datasets(input_file: str) -> None:
     conn.close()
 
 
-def download_dataset(date: datetime.datetime, name: str, retries: int = 100) -> json:
-    if retries < 0:
-        return None
-
-    url: str = f"https://data.opensanctions.org/datasets/{date.strftime('%Y%m%d')}/{name}/index.json"
-    response: requests.Response = requests.get(url)
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return download_dataset(date - datetime.timedelta(days=1), name, retries - 1)
-
-
 def extract_schemas(output_file: str):
     conn = get_connection()
     cursor = conn.cursor()
@@ -87,16 +286,24 @@ def extract_schemas(output_file: str):
 
 if __name__ == '__main__':
     modes: list[tuple] = [
-        ("download_datasets", download_datasets, "<input: path to index.json>"),
-        ("write_entities", write_entities, "<input: path to entities.ftm.json>"),
+        ("download_datasets", download_datasets,
+         "<input: path to index.json> [workers=8] [cache_dir=<input dir>/cache] [offline=false] [base_url=<url>]"),
+        ("write_entities", write_entities,
+         "<input: path to entities.ftm.json> [batch_size=10000] [offset=<byte>] [line=<line>]"),
+        ("update_entities", update_entities, "<input: path to entities.ftm.json> [batch_size=10000] [fuzzy=false]"),
+        ("write_entities_parallel", write_entities_parallel,
+         "<input: path to entities.ftm.json> [workers=<cpu count>] [shard_size=8388608] [offset=<byte>]"),
         ("extract_schemas", extract_schemas, "<output: path to schemas.txt>")
     ]
 
-    if len(sys.argv) != 3 or sys.argv[1] not in list(map(lambda x: x[0], modes)):
-        msg = "Please provide mode and input/ output file. \nAvailable modes: "
+    if len(sys.argv) < 3 or sys.argv[1] not in list(map(lambda x: x[0], modes)):
+        msg = "Please provide mode and input/ output file (and optional key=value options). \nAvailable modes: "
         msg += ';'.join(map(lambda x: x[0] + ' ' + x[2], modes))
         exit(msg)
 
+    args: list[str] = [arg for arg in sys.argv[2:] if "=" not in arg]
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+
     for mode in modes:
         if sys.argv[1] == mode[0]:
-            mode[1](sys.argv[2])
+            mode[1](*args, **options)
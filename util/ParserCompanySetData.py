@@ -1,36 +1,85 @@
 import sys
-import csv
-from io import StringIO
+import threading
 
-from DB import get_connection
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 
+from DB import get_connection, copy_rows
+from Progress import Progress
 
-def parser_company_set_data(input_file: str):
-    conn = get_connection()
-    cursor = conn.cursor()
+CSV_COLUMNS: list[str] = ["row", "name", "domain", "year_founded", "industry", "size_range", "locality", "country",
+                          "linkedin_url", "current_employee_estimate", "total_employee_estimate"]
+COMPANY_COLUMNS: list[str] = ["id"] + CSV_COLUMNS[1:]
+INTEGER_COLUMNS: list[str] = ["year_founded", "current_employee_estimate", "total_employee_estimate"]
+
+
+def coerce_integers(df: pd.DataFrame) -> (pd.DataFrame, pd.Series):
+    values: pd.DataFrame = np.trunc(df[INTEGER_COLUMNS].apply(pd.to_numeric, errors="coerce"))
+    invalid: pd.Series = ((values.isna() & df[INTEGER_COLUMNS].notna()) | (values.abs() > 2 ** 31 - 1)).any(axis=1)
+
+    return values, invalid
 
-    with open(input_file, encoding="UTF-8") as f:
-        for i, line in enumerate(f):
-            print(f"\r{float(i)}", end="")
-            if i == 0:
-                continue
 
-            try:
-                row = next(csv.reader(StringIO(line)))
-                row = [(None if value == "" else value) for value in row]
-                row[3] = None if row[3] is None else int(float(row[3]))
+def row_ids(df: pd.DataFrame) -> (pd.Series, pd.Series):
+    # The id is the row key of the CSV (first column), so it does not depend on the rows rejected before
+    ids: pd.Series = pd.to_numeric(df["row"], errors="coerce")
+    invalid: pd.Series = ids.isna() | (ids % 1 != 0) | (ids.abs() > 2 ** 31 - 1)
 
-                cursor.execute(
-                    '''INSERT INTO companies (
-                        id, name, domain, year_founded, industry, size_range, locality, country, linkedin_url, 
-                        current_employee_estimate, total_employee_estimate
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                    (i, row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10]))
+    return ids, invalid
 
-            except:
-                print("ERROR:", line, "\n")
 
-    conn.commit()
+def parser_company_set_data(input_file: str, block_size: int = 16 * 2 ** 20, quarantine_file: str = None):
+    quarantine_file = quarantine_file or f"{input_file}.rejected"
+    lock: threading.Lock = threading.Lock()
+    rejected: int = 0
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    progress: Progress = Progress("Companies")
+
+    with open(quarantine_file, "w", encoding="UTF-8") as quarantine:
+        def reject_row(row: pv.InvalidRow) -> str:
+            nonlocal rejected
+            with lock:
+                rejected += 1
+                quarantine.write(row.text + "\n")
+            return "skip"
+
+        reader: pv.CSVStreamingReader = pv.open_csv(
+            input_file,
+            read_options=pv.ReadOptions(column_names=CSV_COLUMNS, skip_rows=1, block_size=int(block_size)),
+            parse_options=pv.ParseOptions(invalid_row_handler=reject_row),
+            convert_options=pv.ConvertOptions(column_types={col: pa.string() for col in CSV_COLUMNS}))
+
+        inserted: int = 0
+        for batch in reader:
+            df: pd.DataFrame = batch.to_pandas()
+            ids, invalid_ids = row_ids(df)
+            values, invalid = coerce_integers(df)
+            invalid |= invalid_ids
+
+            if invalid.any():
+                with lock:
+                    rejected += int(invalid.sum())
+                    df.loc[invalid, CSV_COLUMNS].to_csv(quarantine, header=False, index=False)
+                df, ids, values = df[~invalid].copy(), ids[~invalid], values[~invalid]
+
+            df["id"] = ids.astype("int64")
+            df[INTEGER_COLUMNS] = values.astype("Int64")
+
+            copy_rows(cursor, "companies", COMPANY_COLUMNS, df[COMPANY_COLUMNS].to_csv(header=False, index=False),
+                      "WITH (FORMAT csv)")
+            conn.commit()
+
+            inserted += len(df)
+            progress.update(inserted)
+
+    progress.finish()
+    print(f"Inserted {inserted:,} companies ({progress.rate():,.0f} rows/s), "
+          f"rejected {rejected:,} rows (see {quarantine_file})")
+
     conn.close()
 
 
@@ -50,15 +99,19 @@ def extract_industries(output_file: str):
 
 if __name__ == '__main__':
     modes = [
-        ("parser_company_set_data", parser_company_set_data, "<input: path to companies_sorted.csv>"),
+        ("parser_company_set_data", parser_company_set_data,
+         "<input: path to companies_sorted.csv> [block_size=16777216] [quarantine_file=<input>.rejected]"),
         ("extract_industries", extract_industries, "<output: path to industries.txt>")
     ]
 
-    if len(sys.argv) != 3 or sys.argv[1] not in list(map(lambda x: x[0], modes)):
-        msg = "Please provide mode and input/ output file. \nAvailable modes: "
+    if len(sys.argv) < 3 or sys.argv[1] not in list(map(lambda x: x[0], modes)):
+        msg = "Please provide mode and input/ output file (and optional key=value options). \nAvailable modes: "
         msg += ';'.join(map(lambda x: x[0] + ' ' + x[2], modes))
         exit(msg)
 
+    args: list[str] = [arg for arg in sys.argv[2:] if "=" not in arg]
+    options: dict = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+
     for mode in modes:
         if sys.argv[1] == mode[0]:
-            mode[1](sys.argv[2])
+            mode[1](*args, **options)
@@ -0,0 +1,25 @@
+import time
+
+
+class Progress:
+    def __init__(self, label: str, interval: float = 1.0):
+        self.label: str = label
+        self.interval: float = interval
+        self.started: float = time.monotonic()
+        self.printed: float = 0.0
+        self.count: int = 0
+
+    def update(self, count: int, force: bool = False) -> None:
+        self.count = count
+        now: float = time.monotonic()
+
+        if force or now - self.printed >= self.interval:
+            self.printed = now
+            print(f"\r{self.label}: {count:,} ({self.rate():,.0f}/s)", end="")
+
+    def rate(self) -> float:
+        return self.count / max(time.monotonic() - self.started, 1e-9)
+
+    def finish(self) -> None:
+        self.update(self.count, force=True)
+        print(f"\n{self.label}: {self.count:,} in {time.monotonic() - self.started:.1f}s")